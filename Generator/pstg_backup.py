@@ -0,0 +1,100 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+BACKUP_DIR_NAME = '.pstg_backups' # 出力フォルダごとのバックアップ保存先
+BACKUP_INDEX_NAME = 'index.json' # バックアップの一覧
+DEFAULT_MAX_BACKUPS = 10 # ファイルごとに残すバックアップ数の既定値
+DEFAULT_MAX_BACKUP_BYTES = 16 * 1024 * 1024 # 出力フォルダごとのバックアップ合計サイズの既定値
+
+def get_backup_dir(file_path):
+    """出力ファイルのバックアップ保存先のパスを取得"""
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), BACKUP_DIR_NAME)
+
+def _load_index(backup_dir):
+    """バックアップの一覧を読み込む (存在しない・壊れている場合は空)"""
+    try:
+        with open(os.path.join(backup_dir, BACKUP_INDEX_NAME), 'r', encoding='utf-8') as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return []
+
+def _save_index(backup_dir, entries):
+    """バックアップの一覧を保存する"""
+    index_path = os.path.join(backup_dir, BACKUP_INDEX_NAME)
+    temp_path = f'{index_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as index_file:
+        json.dump(entries, index_file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, index_path)
+
+def _blob_path(backup_dir, content_hash):
+    """内容ハッシュに対応するバックアップファイルのパス"""
+    return os.path.join(backup_dir, f'{content_hash}.gz')
+
+def _blob_size(backup_dir, content_hash):
+    """バックアップファイルのサイズ (存在しない場合は0)"""
+    try:
+        return os.path.getsize(_blob_path(backup_dir, content_hash))
+    except OSError:
+        return 0
+
+def _prune(backup_dir, entries, file_name, new_entry, max_backups, max_bytes):
+    """保持数と合計サイズの上限を超えたバックアップを古い順に削除対象にし、残す一覧を返す"""
+    # ファイルごとの保持数（今回のバックアップは常に残す）
+    if max_backups > 0:
+        own_entries = [entry for entry in entries if entry['file'] == file_name]
+        expired = own_entries[:max(len(own_entries) - max_backups, 0)]
+        expired_ids = {id(entry) for entry in expired if entry is not new_entry}
+        entries = [entry for entry in entries if id(entry) not in expired_ids]
+
+    # フォルダ全体の合計サイズ（同じ内容は1つとして数える）
+    if max_bytes > 0:
+        blob_sizes = {entry['hash']: _blob_size(backup_dir, entry['hash']) for entry in entries}
+        total_size = sum(blob_sizes.values())
+        kept = list(entries)
+        for entry in entries:
+            if total_size <= max_bytes:
+                break
+            if entry is new_entry:
+                continue
+            kept.remove(entry)
+            if not any(other['hash'] == entry['hash'] for other in kept):
+                total_size -= blob_sizes[entry['hash']]
+        entries = kept
+    return entries
+
+def backup_file(file_path, max_backups=DEFAULT_MAX_BACKUPS, max_bytes=DEFAULT_MAX_BACKUP_BYTES):
+    """既存ファイルを圧縮してバックアップ保存先に保存し、上限を超えた古いバックアップを削除する (失敗した場合は例外)"""
+    with open(file_path, 'rb') as source_file:
+        content = source_file.read()
+    content_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+    backup_dir = get_backup_dir(file_path)
+    os.makedirs(backup_dir, exist_ok=True)
+
+    # 同じ内容のバックアップが既にあれば再利用する（内容アドレス方式）
+    blob_path = _blob_path(backup_dir, content_hash)
+    if not os.path.exists(blob_path):
+        temp_path = f'{blob_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as blob_file:
+            blob_file.write(gzip.compress(content, mtime=0))
+        os.replace(temp_path, blob_path)
+
+    file_name = os.path.basename(file_path)
+    previous_entries = _load_index(backup_dir)
+    new_entry = {"file": file_name, "time": datetime.now().strftime("%Y%m%d%H%M%S"), "hash": content_hash, "size": len(content)}
+    entries = _prune(backup_dir, previous_entries + [new_entry], file_name, new_entry, max_backups, max_bytes)
+    _save_index(backup_dir, entries)
+
+    # 一覧から外れ、他から参照されていないバックアップファイルを削除する
+    kept_hashes = {entry['hash'] for entry in entries}
+    for removed_hash in {entry['hash'] for entry in previous_entries} - kept_hashes:
+        try:
+            os.remove(_blob_path(backup_dir, removed_hash))
+            logging.info(f"古いバックアップを削除しました: {removed_hash}")
+        except OSError:
+            pass
+
+    return blob_path
@@ -0,0 +1,107 @@
+import os
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pstg_generate
+import pstg_loader
+import pstg_util
+
+_worker_app_config = None # ワーカープロセスで使用する設定
+_worker_delete_temp = True # ワーカープロセスでTempを削除するか
+
+def parse_args(argv):
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(prog='PoseScaleTomlGenerator', description='gm_module_tbl.farcからPose/Scale TOMLを生成します')
+    parser.add_argument('files', nargs='*', help='処理するFARCファイル（複数指定でバッチモード）')
+    parser.add_argument('--list', dest='list_file', help='処理するFARCファイルのパスを1行ずつ記載したリストファイル')
+    parser.add_argument('--scan', dest='scan_root', help='指定フォルダ以下の全gm_module_tbl.farcを再帰的に検索して処理する')
+    parser.add_argument('--force', action='store_true', help='入力が変更されていないFARC・モジュールも再生成する')
+    parser.add_argument('--serve', action='store_true', help='常駐モードで起動し、ローカルソケットで生成ジョブを受け付ける')
+    parser.add_argument('--stop', action='store_true', help='常駐モードのプロセスを停止する')
+    parser.add_argument('--port', type=int, default=None, help='常駐モードのポート番号')
+    parser.add_argument('--output-dir', dest='output_dir', help='Tomlファイルの出力先フォルダ（単一ファイル処理時）')
+    parser.add_argument('--workers', type=int, default=None, help='バッチモードの並列数（0の場合はCPU数）')
+    parser.add_argument('--dump-module-data', dest='dump_module_data', choices=('json', 'binary'), help='抽出したモジュールデータをTempに保存する（--replayで再生できる）')
+    parser.add_argument('--replay', dest='replay_file', help='保存したモジュールデータからFARCを解凍せずにTomlファイルを生成する')
+    return parser.parse_args(argv)
+
+def is_batch_args(args):
+    """バッチモードで実行するか判定する"""
+    return len(args.files) > 1 or bool(args.list_file)
+
+def collect_archive_paths(args):
+    """引数とリストファイルから処理対象のFARCパスを収集する"""
+    farc_paths = [path.strip('{}') for path in args.files] # ドラッグ＆ドロップされたファイル
+    if args.list_file:
+        with open(args.list_file, 'r', encoding='utf-8-sig') as list_file:
+            for line in list_file:
+                line = line.strip()
+                # 空行とコメント行をスキップする
+                if line and not line.startswith('#'):
+                    farc_paths.append(line.strip('"'))
+
+    # 重複を除外する（順序は維持）
+    return list(dict.fromkeys(os.path.abspath(path) for path in farc_paths))
+
+def resolve_worker_count(app_config, workers=None):
+    """並列数を決定する (引数 > Config.ini > CPU数)"""
+    if workers is None:
+        workers = app_config.get('BatchWorkers', 0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def _init_worker(app_config, setting_file_cache, delete_temp):
+    """ワーカープロセスの初期化（設定は親プロセスで一度だけ読み込んだものを使用する）"""
+    global _worker_app_config, _worker_delete_temp
+    _worker_app_config = app_config
+    _worker_delete_temp = delete_temp
+    pstg_loader.seed_setting_file_cache(setting_file_cache)
+    # 複数プロセスから同じログファイルをローテーションすると競合するため、ワーカーはコンソールのみに出力する
+    pstg_util.setup_logging(output_log=False)
+
+def _process_archive(farc_path):
+    """ワーカープロセスで1つのFARCを処理し、(パス, 終了コード, メッセージ) を返す"""
+    try:
+        if not os.path.isfile(farc_path):
+            logging.error(f"ファイルが存在しません: {farc_path}")
+            return farc_path, pstg_generate.EXIT_NO_DATA, "ファイルが存在しません"
+        exit_code = pstg_generate.generate_for_archive(farc_path, _worker_app_config)
+        return farc_path, exit_code, ""
+    except Exception as e:
+        logging.error(f"予期せぬエラーが発生しました: {farc_path}: {e}")
+        return farc_path, pstg_generate.EXIT_ERROR, str(e)
+    finally:
+        # アーカイブごとに作業ディレクトリを分ける（前のアーカイブの解凍結果を読み込まないようにする）
+        if _worker_delete_temp:
+            pstg_util.clean_temp_dir()
+        else:
+            pstg_util.reset_temp_dir()
+
+def run_batch(farc_paths, app_config, workers=None, delete_temp=True):
+    """複数のFARCをプロセスプールで並列処理し、各アーカイブの結果を返す"""
+    workers = min(resolve_worker_count(app_config, workers), max(len(farc_paths), 1))
+    logging.info(f"バッチモードで処理します: {len(farc_paths)}件, 並列数: {workers}")
+
+    # PoseScaleDataの設定ファイルは親プロセスで一度だけ解析してワーカーに渡す
+    setting_file_cache = pstg_loader.preload_setting_files(app_config)
+
+    if workers == 1:
+        # 並列化しない場合はプロセスを起動せずに処理する
+        _init_worker(app_config, setting_file_cache, delete_temp)
+        results = [_process_archive(farc_path) for farc_path in farc_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(app_config, setting_file_cache, delete_temp)) as executor:
+            results = list(executor.map(_process_archive, farc_paths))
+
+    return results
+
+def report_results(results):
+    """バッチ処理の結果を表示し、全体の終了コードを返す"""
+    failed = [result for result in results if result[1] != pstg_generate.EXIT_OK]
+    for farc_path, exit_code, message in results:
+        status = "OK" if exit_code == pstg_generate.EXIT_OK else f"NG({exit_code})"
+        print(f"[{status}] {farc_path}" + (f": {message}" if message else ""))
+    print(f"バッチ処理が完了しました: 成功 {len(results) - len(failed)}件 / 失敗 {len(failed)}件")
+    logging.info(f"バッチ処理が完了しました: 成功 {len(results) - len(failed)}件 / 失敗 {len(failed)}件")
+    return pstg_generate.EXIT_ERROR if failed else pstg_generate.EXIT_OK
@@ -0,0 +1,89 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+from pstg_module_table import ModuleTable
+
+CACHE_FORMAT_VERSION = 3 # キャッシュ形式のバージョン（形式を変更した場合は更新する）
+SAMPLE_SIZE = 1024 * 1024 # 内容ハッシュに使用する先頭・末尾のサイズ
+
+def get_cache_dir(app_config):
+    """抽出キャッシュのディレクトリパスを取得"""
+    return os.path.join(app_config['SettingsDir'], 'Cache', 'Extract')
+
+def compute_farc_fingerprint(farc_path):
+    """FARCのサイズ・更新日時・内容ハッシュからキャッシュキーを生成する"""
+    stat = os.stat(farc_path)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{CACHE_FORMAT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+
+    # 高速化のため先頭と末尾のみをハッシュする（サイズと更新日時もキーに含む）
+    with open(farc_path, 'rb') as farc_file:
+        hasher.update(farc_file.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE * 2:
+            farc_file.seek(-SAMPLE_SIZE, os.SEEK_END)
+        hasher.update(farc_file.read(SAMPLE_SIZE))
+
+    return hasher.hexdigest()
+
+def load_module_table(app_config, cache_key):
+    """キャッシュからモジュールテーブルを読み込む (存在しない場合はNone)"""
+    cache_path = os.path.join(get_cache_dir(app_config), f'{cache_key}.bin')
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            module_table = ModuleTable.from_columns(json.loads(zlib.decompress(cache_file.read()).decode('utf-8')))
+        os.utime(cache_path) # LRU判定のため最終利用日時を更新する
+    except (OSError, ValueError, KeyError, TypeError, OverflowError, zlib.error) as e:
+        logging.warning(f"抽出キャッシュの読み込みに失敗しました (無視します): {e}")
+        return None
+
+    logging.info(f"抽出キャッシュを使用します: {cache_path}")
+    return module_table
+
+def save_module_table(app_config, cache_key, module_table):
+    """モジュールテーブルをキャッシュに保存し、上限を超えた古いキャッシュを削除する"""
+    cache_dir = get_cache_dir(app_config)
+    cache_path = os.path.join(cache_dir, f'{cache_key}.bin')
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        payload = json.dumps(module_table.to_columns(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with open(temp_path, 'wb') as cache_file:
+            cache_file.write(zlib.compress(payload))
+        os.replace(temp_path, cache_path)
+        logging.info(f"抽出キャッシュを保存しました: {cache_path}")
+    except OSError as e:
+        logging.warning(f"抽出キャッシュの保存に失敗しました (無視します): {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+
+    evict_cache(cache_dir, app_config.get('ExtractCacheMaxMB', 32) * 1024 * 1024)
+
+def evict_cache(cache_dir, max_bytes):
+    """合計サイズが上限を超えた場合、最終利用日時が古いキャッシュから削除する (LRU)"""
+    cache_files = [] # (最終利用日時, サイズ, パス) のリスト
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except OSError: # 他のプロセスが削除した場合
+                    continue
+                cache_files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in cache_files)
+    for _, size, path in sorted(cache_files):
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+            logging.info(f"古い抽出キャッシュを削除しました: {path}")
+        except OSError as e:
+            logging.warning(f"抽出キャッシュの削除に失敗しました (無視します): {e}")
@@ -1,6 +1,7 @@
 import configparser
 import os
 import logging
+import pstg_module_dump
 from pstg_util import get_app_dir
 
 def load_app_config():
@@ -45,6 +46,16 @@ def load_app_config():
         'SaveInParentDirectory': config.getboolean('GeneralSettings', 'SaveInParentDirectory', fallback=False),
         # OverwriteExistingFiles（既存のファイルを上書きする）
         'OverwriteExistingFiles': config.getboolean('GeneralSettings', 'OverwriteExistingFiles', fallback=False),
+        # MaxBackups（ファイルごとに残すバックアップ数、0の場合は制限なし）
+        'MaxBackups': config.getint('GeneralSettings', 'MaxBackups', fallback=10),
+        # MaxBackupMB（出力フォルダごとのバックアップの上限サイズ、0の場合は制限なし）
+        'MaxBackupMB': config.getint('GeneralSettings', 'MaxBackupMB', fallback=16),
+        # SortOutputById（TOMLのエントリをモジュールID順に出力する）
+        'SortOutputById': config.getboolean('GeneralSettings', 'SortOutputById', fallback=False),
+        # MergePoseToml（既存のPose TOMLを置き換えず、変更のあったIDの行のみ更新する）
+        'MergePoseToml': config.getboolean('GeneralSettings', 'MergePoseToml', fallback=False),
+        # MergeDropMissing（マージ時に今回出力しないIDの行を削除する）
+        'MergeDropMissing': config.getboolean('GeneralSettings', 'MergeDropMissing', fallback=False),
         # UseModuleNameContains（モジュール名を含める）
         'UseModuleNameContains': config.getboolean('GeneralSettings', 'UseModuleNameContains', fallback=False),
         # Language（言語）
@@ -55,6 +66,20 @@ def load_app_config():
         'OutputLog': config.getboolean('DebugSettings', 'OutputLog', fallback=False),
         # DeleteTemp（一時ファイルを削除する）
         'DeleteTemp': config.getboolean('DebugSettings', 'DeleteTemp', fallback=True),
+        # DumpModuleData（抽出したモジュールデータをTempに保存する形式、none / json / binary）
+        'DumpModuleData': config.get('DebugSettings', 'DumpModuleData', fallback='none').strip().lower(),
+        # BatchWorkers（バッチモードの並列数、0の場合はCPU数）
+        'BatchWorkers': config.getint('BatchSettings', 'Workers', fallback=0),
+        # UseDaemon（常駐プロセスが起動していれば処理を依頼する）
+        'UseDaemon': config.getboolean('DaemonSettings', 'UseDaemon', fallback=False),
+        # DaemonPort（常駐モードのポート番号）
+        'DaemonPort': config.getint('DaemonSettings', 'Port', fallback=47811),
+        # UseExtractCache（抽出キャッシュを使用する）
+        'UseExtractCache': config.getboolean('CacheSettings', 'UseExtractCache', fallback=True),
+        # ExtractCacheMaxMB（抽出キャッシュの上限サイズ）
+        'ExtractCacheMaxMB': config.getint('CacheSettings', 'ExtractCacheMaxMB', fallback=32),
+        # UseIncrementalBuild（前回から変更のないモジュールの出力を再利用する）
+        'UseIncrementalBuild': config.getboolean('CacheSettings', 'UseIncrementalBuild', fallback=True),
         # HistoryLimit（履歴制限）
         # 'HistoryLimit': config.getint('DebugSettings', 'HistoryLimit', fallback=50),
         'ConfigParser': config, # Main config（メイン設定）
@@ -64,3 +89,19 @@ def load_app_config():
     
     logging.info(f"設定を読み込みました: {app_config}")
     return app_config
+
+def apply_debug_settings(app_config):
+    """デバッグ設定が非表示の場合、デバッグ用の設定を既定値に戻す (設定の読み込み・再読み込みのたびに呼び出す)"""
+    show_debug = app_config['ConfigParser'].getboolean('DebugSettings', 'ShowDebugSettings', fallback=False)
+    if not show_debug:
+        app_config['OutputLog'] = False
+        app_config['DeleteTemp'] = True
+        app_config['DumpModuleData'] = 'none'
+    keep_temp_for_dump(app_config)
+    return app_config
+
+def keep_temp_for_dump(app_config):
+    """モジュールデータを保存する場合、保存したデータが削除されないようTempを残す"""
+    if app_config.get('DumpModuleData', 'none') in pstg_module_dump.DUMP_FORMATS:
+        app_config['DeleteTemp'] = False
+    return app_config
@@ -0,0 +1,153 @@
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+import pstg_config
+import pstg_generate
+import pstg_loader
+import pstg_module_dump
+import pstg_settings_cache
+import pstg_util
+
+DEFAULT_PORT = 47811 # 常駐モードの既定ポート
+CONNECT_TIMEOUT = 0.5 # クライアントの接続タイムアウト（秒）
+MAX_REQUEST_SIZE = 64 * 1024 # リクエスト1行の最大サイズ
+
+def get_port(app_config):
+    """常駐モードのポート番号を取得"""
+    return app_config.get('DaemonPort', DEFAULT_PORT) or DEFAULT_PORT
+
+def _config_signature(app_config):
+    """Config.iniとTomlProfile.iniの更新日時とサイズ"""
+    signature = []
+    for file_name in ('Config.ini', 'TomlProfile.ini'):
+        try:
+            stat = os.stat(os.path.join(app_config['SettingsDir'], file_name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return signature
+
+# 常駐中の設定（設定ファイルが更新された場合のみ再読み込みする）
+class WarmSettings:
+    # 初期化
+    def __init__(self, app_config, delete_temp):
+        self.app_config = app_config # アプリケーション設定
+        self.delete_temp = delete_temp # ジョブごとにTempを削除するか
+        self.signature = _config_signature(app_config) # 読み込み時の設定ファイルの状態
+        pstg_loader.preload_setting_files(app_config) # PoseScaleDataを事前に解析しておく
+
+    # 設定ファイルが更新されていれば再読み込みする
+    def refresh(self):
+        signature = _config_signature(self.app_config)
+        if signature != self.signature:
+            logging.info("設定ファイルの更新を検出したため再読み込みします")
+            self.app_config = pstg_config.apply_debug_settings(pstg_settings_cache.load_settings())
+            self.signature = signature
+        # PoseScaleDataは読み込み時に更新日時を確認し、更新されたファイルのみ再解析される
+        return self.app_config
+
+# 1接続につき1行のJSONリクエストを処理するハンドラー
+class JobHandler(socketserver.StreamRequestHandler):
+    # リクエスト処理
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST_SIZE).decode('utf-8'))
+        except (ValueError, UnicodeDecodeError) as e:
+            self._respond({"exit_code": pstg_generate.EXIT_ERROR, "message": f"不正なリクエストです: {e}"})
+            return
+
+        command = request.get('command', 'generate')
+        if command == 'ping':
+            self._respond({"exit_code": pstg_generate.EXIT_OK, "message": "pong"})
+        elif command == 'shutdown':
+            self._respond({"exit_code": pstg_generate.EXIT_OK, "message": "shutdown"})
+            # serve_foreverと同じスレッドからshutdownを呼ぶとデッドロックするため別スレッドで停止する
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif command == 'generate':
+            self._respond(self._generate(request))
+        else:
+            self._respond({"exit_code": pstg_generate.EXIT_ERROR, "message": f"不明なコマンドです: {command}"})
+
+    # 生成ジョブの実行
+    def _generate(self, request):
+        farc_path = request.get('farc', '')
+        if not os.path.isfile(farc_path):
+            return {"exit_code": pstg_generate.EXIT_NO_DATA, "message": f"ファイルが存在しません: {farc_path}"}
+
+        warm_settings = self.server.warm_settings
+        job_config = warm_settings.app_config
+        try:
+            job_config = self._job_config(warm_settings.refresh(), request)
+            logging.info(f"ジョブを受け付けました: {farc_path}")
+            exit_code = pstg_generate.generate_for_archive(farc_path, job_config, output_dir=request.get('output_dir'))
+            return {"exit_code": exit_code, "message": ""}
+        except Exception as e:
+            logging.error(f"予期せぬエラーが発生しました: {farc_path}: {e}")
+            return {"exit_code": pstg_generate.EXIT_ERROR, "message": str(e)}
+        finally:
+            # ジョブごとに作業ディレクトリを分ける（モジュールデータを保存した場合はTempを残す）
+            if warm_settings.delete_temp and job_config.get('DeleteTemp', True):
+                pstg_util.clean_temp_dir()
+            else:
+                pstg_util.reset_temp_dir()
+
+    # 依頼元のコマンドライン指定を反映したジョブ用の設定（常駐中の設定は変更しない）
+    def _job_config(self, app_config, request):
+        job_config = dict(app_config)
+        if request.get('force'):
+            job_config['ForceRebuild'] = True # 前回の生成結果を使用せずに全モジュールを再生成する
+        if request.get('dump_module_data') in pstg_module_dump.DUMP_FORMATS:
+            job_config['DumpModuleData'] = request['dump_module_data']
+            pstg_config.keep_temp_for_dump(job_config)
+        return job_config
+
+    # レスポンスの送信
+    def _respond(self, response):
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+def serve(app_config, port=None, delete_temp=True):
+    """常駐モードでジョブを待ち受ける（ジョブはTempの状態を共有しないよう1件ずつ処理する）"""
+    port = port or get_port(app_config)
+    with socketserver.TCPServer(('127.0.0.1', port), JobHandler) as server:
+        server.warm_settings = WarmSettings(app_config, delete_temp)
+        print(f"常駐モードで待ち受けています: 127.0.0.1:{port}")
+        logging.info(f"常駐モードで待ち受けています: 127.0.0.1:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    logging.info("常駐モードを終了しました")
+    return pstg_generate.EXIT_OK
+
+def send_request(request, port):
+    """常駐プロセスにリクエストを送信してレスポンスを返す (接続できない場合はNone)"""
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=CONNECT_TIMEOUT) as sock:
+            sock.settimeout(None) # 生成ジョブの完了まで待つ
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as response_file:
+                return json.loads(response_file.readline().decode('utf-8'))
+    except (OSError, ValueError) as e:
+        logging.debug(f"常駐プロセスに接続できませんでした: {e}")
+        return None
+
+def submit_job(farc_path, app_config, output_dir=None, force=False, dump_module_data=None):
+    """常駐プロセスに生成ジョブを依頼して終了コードを返す (常駐プロセスがない場合はNone)"""
+    # 相対パスは常駐プロセスではなく依頼元の作業ディレクトリを基準に解決する
+    request = {
+        "command": "generate",
+        "farc": os.path.abspath(farc_path.strip('{}')),
+        "output_dir": os.path.abspath(output_dir) if output_dir else None,
+        "force": force, # 全モジュールを再生成するか
+        "dump_module_data": dump_module_data # モジュールデータの保存形式
+    }
+    response = send_request(request, get_port(app_config))
+    if response is None:
+        return None
+    if response.get('message'):
+        print(response['message'])
+    logging.info(f"常駐プロセスで処理しました: {farc_path} (終了コード: {response.get('exit_code')})")
+    return response.get('exit_code', pstg_generate.EXIT_ERROR)
@@ -0,0 +1,129 @@
+import os
+import shutil
+import hashlib
+import logging
+import itertools
+import pstg_backup
+import pstg_util
+
+WRITE_BUFFER_SIZE = 256 * 1024 # 一時ファイルへの書き込みバッファサイズ
+_temp_counter = itertools.count() # 一時ファイル名の連番（同じ保存先に複数のエミッターがある場合も衝突しない）
+
+# TOMLエントリを受け取った順に一時ファイルへ書き込み、完了時に保存先と置き換える（エントリを結合した文字列を作らない）
+class TomlEmitter:
+    # 初期化（sort_by_id=Trueの場合はモジュールID順に並べ替えて出力する）
+    def __init__(self, file_path, sort_by_id=False):
+        self.file_path = file_path # 保存先のパス
+        self.sort_by_id = sort_by_id # モジュールID順に出力するか
+        self.count = 0 # 受け取ったエントリ数
+        self.failed = False # 書き込みに失敗したか
+        self._file = None # 一時ファイル（最初のエントリで作成）
+        self._temp_path = None
+        self._hasher = hashlib.blake2b(digest_size=16) # 書き込んだ内容のハッシュ
+        self._separator = pstg_util.encode_text_output('\n') # エントリの区切り
+        self._pending = [] # ソート待ちの (モジュールID, エントリ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.discard()
+
+    # エントリの追加
+    def push(self, entry, module_id=0):
+        if self.failed:
+            return
+        self.count += 1
+        data = pstg_util.encode_text_output(entry)
+        try:
+            if self.sort_by_id:
+                self._pending.append((module_id, data))
+            else:
+                self._write(data)
+        except OSError as e:
+            self._fail(e)
+
+    # 一時ファイルの作成（保存先と同じディレクトリに作成し、完了時に置き換える）
+    def _open(self):
+        if self._file is None:
+            # 通常のファイル作成と同じ権限（umask適用）で作成する
+            self._temp_path = f'{self.file_path}.{os.getpid()}.{next(_temp_counter)}.tmp'
+            self._file = open(self._temp_path, 'xb', buffering=WRITE_BUFFER_SIZE)
+
+    # 一時ファイルへのバイト列の書き込み
+    def _write_bytes(self, data):
+        self._file.write(data)
+        self._hasher.update(data)
+
+    # 一時ファイルへのエントリの書き込み（2件目以降は区切りを前に付ける）
+    def _write(self, data):
+        if self._file is None:
+            self._open()
+        else:
+            self._write_bytes(self._separator)
+        self._write_bytes(data)
+
+    # ソート待ちのエントリをモジュールID順に一時ファイルへ書き込む（同じモジュールIDは受け取った順を保つ）
+    def _flush_sorted(self):
+        self._pending.sort(key=lambda item: item[0])
+        for _, data in self._pending:
+            self._write(data)
+        self._pending = []
+
+    def _fail(self, error):
+        logging.error(f"ファイルの保存に失敗しました: {error}")
+        self.failed = True
+        self.discard()
+
+    # 完了（内容が同じ場合は置き換えず、成功した場合は内容のハッシュを返す）
+    def finish(self, overwrite=False, max_backups=pstg_backup.DEFAULT_MAX_BACKUPS, max_backup_bytes=pstg_backup.DEFAULT_MAX_BACKUP_BYTES):
+        if self.failed:
+            return None
+        try:
+            if self.sort_by_id:
+                self._flush_sorted()
+        except OSError as e:
+            self._fail(e)
+            return None
+        return self._commit(overwrite, max_backups, max_backup_bytes)
+
+    # 一時ファイルで保存先を置き換える（内容が同じ場合は置き換えない）
+    def _commit(self, overwrite, max_backups, max_backup_bytes):
+        if self._file is None:
+            return None
+        try:
+            self._file.close()
+            self._file = None
+        except OSError as e:
+            self._fail(e)
+            return None
+
+        content_digest = self._hasher.digest()
+        if pstg_util.is_content_unchanged(self.file_path, content_digest):
+            self.discard()
+            return self._hasher.hexdigest()
+        if not pstg_util.backup_existing_file(self.file_path, overwrite, max_backups, max_backup_bytes):
+            self.discard()
+            return None
+        try:
+            if os.path.exists(self.file_path):
+                shutil.copymode(self.file_path, self._temp_path) # 既存のファイルの権限を引き継ぐ
+            os.replace(self._temp_path, self.file_path)
+        except OSError as e:
+            self._fail(e)
+            return None
+        self._temp_path = None
+        self.discard()
+        print(f'ファイルを保存しました {self.file_path}')
+        logging.info(f'ファイルを保存しました {self.file_path}')
+        return self._hasher.hexdigest()
+
+    # 一時ファイルの削除
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+        self._pending = []
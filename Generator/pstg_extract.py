@@ -1,107 +1,111 @@
 import os
-import json
+import re
+import mmap
 import logging
+from functools import partial
 from pstg_util import get_temp_dir
+from pstg_module_table import CORE_KEYS, ModuleTable, log_missing_values
 
-def load_and_combine_text_data():
-    """Tempディレクトリ内のBINファイルを読み込んで結合する"""
+# module.行（module.番号.属性名=値）を抽出する正規表現（バイト列のまま走査する）
+MODULE_LINE_PATTERN = re.compile(rb'^[ \t]*module\.([^.=\r\n]*)\.([^=\r\n]*?)[ \t]*=([^\r\n]*)', re.MULTILINE)
+CORE_KEY_BYTES = {key.encode('ascii'): key for key in CORE_KEYS} # 専用の列を持つ属性名
+
+def iter_temp_bin_files():
+    """Tempディレクトリ内のgm_module_tblフォルダにあるBINファイルのパスを列挙する (FarcPackで解凍した場合)"""
     temp_dir = get_temp_dir()
-    text_data = ''
-    
+
     # gm_module_tblフォルダを検索する。
     gm_module_tbl_dirs = [d for d in os.listdir(temp_dir) if os.path.isdir(os.path.join(temp_dir, d)) and 'gm_module_tbl' in d]
-    
+
     # gm_module_tblフォルダが見つからない場合、ログを出力する。
     if not gm_module_tbl_dirs:
         logging.error("Tempディレクトリにgm_module_tblフォルダが存在しません")
-        return ""
-    
-    # gm_module_tblフォルダ内のファイルを検索する。
+        return
+
+    # gm_module_tblフォルダ内のBINファイルを検索する。
     for dir_name in gm_module_tbl_dirs:
         gm_module_tbl_path = os.path.join(temp_dir, dir_name)
-        # gm_module_tblフォルダ内のファイルを検索する。
         for file_name in os.listdir(gm_module_tbl_path):
-            # BINファイルを検索する。
             if file_name.endswith('.bin'):
-                try:
-                    # BINファイルを読み込む。
-                    with open(os.path.join(gm_module_tbl_path, file_name), 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        # BINファイルの内容を結合する。
-                        if content:
-                            text_data += content
-                            logging.debug(f"{file_name} の内容: {content}")
-                            logging.info(f"Binファイルを正常に読み込みました: {file_name}")
-                        else:
-                            # 空のファイルをスキップする。
-                            logging.warning(f"空のファイルをスキップしました: {file_name}")
-                except Exception as e:
-                    # ファイルの読み込みに失敗した場合、ログを出力する。
-                    logging.error(f"ファイルの読み込みに失敗しました {file_name}: {e}")
-
-    # BINファイルの内容を結合する。
-    if not text_data:
-        logging.error("BINファイルからデータを読み込めませんでした")
-        return ""
-
-    # BINデータを結合する。
-    combined_data = f'BINデータ\n{text_data}\n'
-    logging.info(f"combined_data を正常に読み込みました")
-    return combined_data
-
-def process_data():
-    """BINデータを解析してJSONとして保存し、辞書データを返す"""
-    try:
-        # BINデータを結合する。
-        combined_data = load_and_combine_text_data()
-        # BINデータを結合できなかった場合、ログを出力する。
-        if not combined_data:
-            logging.error("BINデータを結合できませんでした")
-            return []
-
-        modules_by_id = {} # モジュールIDをキーとする辞書
-        
-        # BINデータを解析する。
-        for line in combined_data.splitlines():
-            line = line.strip()
-            # module.で始まる行を解析する。
-            if not line.startswith('module.'):
+                yield os.path.join(gm_module_tbl_path, file_name)
+
+def iter_bin_buffers(bin_entries=None):
+    """BINデータを (ファイル名, バイト列) で列挙する (bin_entriesがない場合はTemp内のファイルをmmapする)"""
+    if bin_entries is not None:
+        for file_name, content in bin_entries:
+            if not content:
+                # 空のファイルをスキップする。
+                logging.warning(f"空のファイルをスキップしました: {file_name}")
                 continue
-            
-            # =で区切る。
-            if '=' in line:
-                key_part, value = line.split('=', 1) # キーと値で区切る。
-                key_part = key_part.strip() # キー部分を空白文字を削除する。
-                value = value.strip() # 値部分を空白文字を削除する。
-                
-                # module_numとkeyで区切る。
-                parts = key_part.split('.')
-                if len(parts) < 3:
+            yield file_name, content
+        return
+
+    for file_path in iter_temp_bin_files():
+        file_name = os.path.basename(file_path)
+        try:
+            with open(file_path, 'rb') as bin_file:
+                if os.fstat(bin_file.fileno()).st_size == 0:
+                    # 空のファイルをスキップする。
+                    logging.warning(f"空のファイルをスキップしました: {file_name}")
                     continue
-                
-                module_num = parts[1] # モジュール番号
-                key = parts[2] # キー
-                
-                # chara, cos, id, nameで区切る。
-                if key in ['chara', 'cos', 'id', 'name']:
-                    # モジュール番号をキーとする辞書に値を格納する。
-                    if module_num not in modules_by_id:
-                        modules_by_id[module_num] = {"module_num": module_num} # モジュール番号をキーとする辞書
-                    
-                    modules_by_id[module_num][key] = value # モジュール番号をキーとする辞書に値を格納する。
-
-        module_data_list = list(modules_by_id.values()) # モジュール番号をキーとする辞書をリストに変換する。
-        module_data_dict = {"modules": module_data_list} # モジュール番号をキーとする辞書を辞書に変換する。
-
-        temp_dir = get_temp_dir() # 一時ディレクトリ
-        module_data_path = os.path.join(temp_dir, 'module_data.json') # モジュールデータのパス
-        
-        # モジュールデータを保存する。
-        with open(module_data_path, 'w', encoding='utf-8') as json_file:
-            json.dump(module_data_dict, json_file, ensure_ascii=False, indent=4)
-
-        logging.info(f"module_data.json を保存しました: {module_data_path}")
-        return module_data_list
+                with mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    yield file_name, buffer
+        except OSError as e:
+            # ファイルの読み込みに失敗した場合、ログを出力する。
+            logging.error(f"ファイルの読み込みに失敗しました {file_name}: {e}")
+
+def iter_module_attributes(bin_entries=None):
+    """BINデータを一度だけ走査し、module.行の (モジュール番号, 属性名, 値) をバイト列のまま順次返す"""
+    for file_name, buffer in iter_bin_buffers(bin_entries):
+        for match in MODULE_LINE_PATTERN.finditer(buffer):
+            yield match.group(1).strip(), match.group(2), match.group(3)
+        logging.info(f"Binファイルを正常に読み込みました: {file_name}")
+
+def _set_core_value(module_table, key, row, value):
+    """専用の列を持つ属性の値を設定する（保持する値のみデコードする）"""
+    module_table.set_value(row, key, value.decode('utf-8', errors='replace').strip())
+
+def process_data(bin_entries=None):
+    """BINデータを解析してモジュールテーブルを返す"""
+    try:
+        module_table = ModuleTable() # モジュールテーブル
+        rows_by_num = {} # モジュール番号 -> 行番号
+        attribute_keys = {} # 属性名（バイト列） -> 値の設定関数
+        last_num, last_row = None, None # 直前の行（BINファイルは同じモジュールの行が連続している）
+
+        # BINデータを解析する（同じモジュール番号の属性は同じ行に結合する）
+        for module_num, key, value in iter_module_attributes(bin_entries):
+            if module_num == last_num:
+                row = last_row
+            else:
+                row = rows_by_num.get(module_num)
+                if row is None:
+                    if not module_num.isdigit():
+                        # module.data_list.length などモジュールではない属性
+                        module_table.metadata[f"{module_num.decode('utf-8', errors='replace')}.{key.decode('utf-8', errors='replace')}"] = value.decode('utf-8', errors='replace').strip()
+                        continue
+                    row = rows_by_num[module_num] = module_table.add_row(module_num.decode('ascii'))
+                last_num, last_row = module_num, row
+
+            setter = attribute_keys.get(key)
+            if setter is None:
+                # chara.xxx のような属性は従来どおり専用の列（chara）の値として扱う
+                core_key = CORE_KEY_BYTES.get(key.split(b'.', 1)[0])
+                if core_key:
+                    setter = partial(_set_core_value, module_table, core_key)
+                else:
+                    setter = module_table.raw_value_setter(key.decode('utf-8', errors='replace')) # 追加属性は参照されるまでデコードしない
+                attribute_keys[key] = setter
+            setter(row, value)
+
+        # BINデータを読み込めなかった場合、ログを出力する。
+        if not module_table:
+            logging.error("BINファイルからモジュールデータを読み込めませんでした")
+            return None
+
+        log_missing_values(module_table)
+
+        return module_table
 
     except Exception as e:
         logging.error(f"Error in process_data: {e}")
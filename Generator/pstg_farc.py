@@ -1,22 +1,50 @@
 import sys
 import os
+import gzip
 import shutil
+import struct
+import zlib
 import subprocess
 import logging
 from pstg_util import get_temp_dir
+from pstg_farc_index import FarcIndex
 
-def get_dragged_file():
+def get_dragged_file(files=None):
     """コマンドライン引数からドラッグされたファイルを取得"""
-    if len(sys.argv) != 2:
+    if files is None:
+        files = sys.argv[1:] # コマンドライン引数
+    if len(files) != 1:
         print("ファイルをドラッグアンドドロップしてください")
         logging.error("引数が正しくありません。ファイルをドラッグアンドドロップしてください。")
         sys.exit(1)
-    dragged_file = sys.argv[1] # ドラッグアンドドロップされたファイル
+    dragged_file = files[0] # ドラッグアンドドロップされたファイル
     logging.info(f"ドラッグアンドドロップされたファイルパス: {dragged_file}")
     return dragged_file
 
+def read_module_tbl_bins(farc_path):
+    """FARCからgm_module_tblのBINデータだけを直接読み込む (非対応形式の場合はNone)"""
+    farc_path = farc_path.strip('{}')
+    try:
+        with FarcIndex(farc_path) as farc_index:
+            if not farc_index.is_supported:
+                return None
+
+            bin_entries = [] # (ファイル名, BINデータ) のリスト
+            for name in farc_index.names():
+                if 'gm_module_tbl' in name and name.endswith('.bin'):
+                    bin_entries.append((name, farc_index.read_entry(name)))
+                    logging.info(f"FARCからBINファイルを読み込みました: {name}")
+
+            if not bin_entries:
+                logging.warning(f"FARC内にgm_module_tblのBINファイルが見つかりませんでした: {farc_index.names()}")
+    except (struct.error, OSError, EOFError, zlib.error, gzip.BadGzipFile) as e:
+        logging.warning(f"FARCのネイティブ読み込みに失敗しました。FarcPackを使用します: {e}")
+        return None
+
+    return bin_entries
+
 def process_file(dragged_file, farc_pack_path):
-    """ファイルをTempにコピーし、FarcPackで解凍する"""
+    """ファイルをTempにコピーし、FarcPackで解凍する（ネイティブ読み込み非対応時のフォールバック）"""
     dragged_file = dragged_file.strip('{}') # ドラッグアンドドロップされたファイル
     temp_dir = get_temp_dir() # 一時ディレクトリ
     
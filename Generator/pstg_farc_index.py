@@ -0,0 +1,103 @@
+import os
+import gzip
+import mmap
+import struct
+import logging
+
+# FARCシグネチャ（FArc: 非圧縮, FArC: gzip圧縮, FARC: 拡張/暗号化形式はFarcPackにフォールバック）
+FARC_SIGNATURE_PLAIN = b'FArc'
+FARC_SIGNATURE_COMPRESSED = b'FArC'
+GZIP_MAGIC = b'\x1f\x8b'
+
+# FARCエントリのインデックス（アーカイブ全体を読み込まず、必要なエントリだけを参照する）
+class FarcIndex:
+    # 初期化（ファイルをmmapし、ヘッダーとエントリテーブルのみ解析する）
+    def __init__(self, farc_path):
+        self.farc_path = farc_path # FARCファイルのパス
+        self.entries = {} # ファイル名をキーとするエントリ辞書（アーカイブ内の順序を保持）
+        self.is_supported = False # ネイティブ読み込みに対応している形式か
+        self._file = open(farc_path, 'rb')
+        self._data = None
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0: # 空ファイルはmmapできない
+                logging.warning(f"FARCファイルが空です: {farc_path}")
+                return
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._parse_header()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # 後始末
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ヘッダーとエントリテーブルの解析
+    def _parse_header(self):
+        data = self._data
+        signature = data[:4] # シグネチャ
+        if signature not in (FARC_SIGNATURE_PLAIN, FARC_SIGNATURE_COMPRESSED):
+            logging.info(f"ネイティブ読み込み非対応のFARC形式です: {signature!r}")
+            return
+
+        is_compressed = signature == FARC_SIGNATURE_COMPRESSED # 圧縮形式か
+        header_size = struct.unpack_from('>I', data, 4)[0] # ヘッダーサイズ（シグネチャとサイズ自体を除く）
+        header_end = 8 + header_size # エントリテーブルの終端
+        if header_end > len(data):
+            logging.warning("FARCヘッダーが不正です（ヘッダーサイズがファイルサイズを超えています）")
+            return
+
+        pos = 12 # シグネチャ・ヘッダーサイズ・アライメントの直後
+        while pos < header_end:
+            name_end = data.find(b'\x00', pos, header_end) # ファイル名の終端
+            if name_end <= pos: # パディングまたは不正なエントリ
+                break
+            name = data[pos:name_end].decode('utf-8', errors='replace') # ファイル名
+            pos = name_end + 1
+
+            if is_compressed:
+                offset, size, original_size = struct.unpack_from('>III', data, pos)
+                pos += 12
+            else:
+                offset, size = struct.unpack_from('>II', data, pos)
+                original_size = size
+                pos += 8
+
+            if offset + size > len(data):
+                logging.warning(f"FARCエントリが範囲外を指しています: {name}")
+                self.entries = {}
+                return
+
+            self.entries[name] = {
+                "name": name, # ファイル名
+                "offset": offset, # データ位置
+                "size": size, # 格納サイズ
+                "original_size": original_size, # 展開後サイズ
+                "compressed": is_compressed # 圧縮されているか
+            }
+
+        self.is_supported = True
+
+    # エントリ名の一覧
+    def names(self):
+        return list(self.entries.keys())
+
+    # 指定エントリのデータを取得（圧縮されている場合は展開する）
+    def read_entry(self, name):
+        entry = self.entries[name]
+        payload = self._data[entry["offset"]:entry["offset"] + entry["size"]]
+        # FArCでも圧縮されずに格納されているエントリがあるため、gzipヘッダーで判定する
+        if entry["compressed"] and payload[:2] == GZIP_MAGIC:
+            payload = gzip.decompress(payload)
+        return payload
@@ -0,0 +1,282 @@
+import os
+import logging
+import pstg_backup
+import pstg_cache
+import pstg_emitter
+import pstg_farc
+import pstg_extract
+import pstg_incremental
+import pstg_loader
+import pstg_manifest
+import pstg_merge
+import pstg_module_dump
+import pstg_pose
+import pstg_profile
+import pstg_resolve
+import pstg_scale
+import pstg_util
+
+# 終了コード
+EXIT_OK = 0 # 正常終了
+EXIT_ERROR = 1 # 予期せぬエラー
+EXIT_NO_DATA = 2 # モジュールデータを抽出できなかった
+EXIT_NO_SETTINGS = 3 # 有効なPoseScale設定がない
+EXIT_NO_FARCPACK = 4 # FarcPackが必要だがパスが無効
+
+def is_valid_farc_pack_path(farc_pack_path):
+    """FarcPackパスが有効か判定する"""
+    return bool(farc_pack_path) and os.path.exists(farc_pack_path) and os.path.basename(farc_pack_path).lower() == 'farcpack.exe'
+
+def generate_profile_pose_toml(selection, app_config, map_chara):
+    """プロファイルにマッチしたモジュールのみを、そのプロファイルの設定でマッチングしてPose TOMLデータを (元の行番号, エントリ) で返す"""
+    profile_settings = pstg_loader.load_profile_settings(selection.profile, app_config)
+    resolutions = pstg_resolve.resolve_modules(selection.modules, profile_settings, map_chara)
+    logging.info(f"プロファイルのPoseを生成しました: {selection.profile.section} ({len(selection.modules)} modules)")
+    return [(selection.rows[row], entry) for row, entry in pstg_pose.iter_pose_entries(selection.modules, resolutions)]
+
+def generate_profile_pose_tomls(profile_selections, app_config, map_chara):
+    """プロファイルごとのPose TOMLデータを順に生成し、(プロファイル, エントリ) のリストを返す (マッチングはCPU処理のためスレッドでは並列化しない)"""
+    return [(selection, generate_profile_pose_toml(selection, app_config, map_chara)) for selection in profile_selections]
+
+def pose_target(profile=None):
+    """Pose TOMLの出力先を表すキー（プロファイル無効時はprofile=None）"""
+    return f"pose:{profile.section}" if profile else "pose:"
+
+SCALE_TARGET = "scale" # Scale TOMLの出力先を表すキー
+
+def generate_module_outputs(module_table, profile_selections, pose_settings, app_config, map_chara):
+    """モジュールごとに出力先キー -> TOMLエントリの辞書を生成し、(モジュールごとの出力, Scaleの決定元) を返す"""
+    module_outputs = [{} for _ in range(len(module_table))] # モジュールごとの出力
+    scale_sources = [None] * len(module_table) # モジュールごとの (スケール, 設定) （競合の報告用）
+
+    # 全モジュールのマッチング（Pose/Scaleで共通）
+    resolutions = pstg_resolve.resolve_modules(module_table, pose_settings, map_chara)
+
+    # Pose TOMLデータの生成（プロファイル有効時はプロファイルごとに生成）
+    logging.info("PoseTomlデータの変換を開始")
+    if app_config['UseModuleNameContains']:
+        for selection, pose_entries in generate_profile_pose_tomls(profile_selections, app_config, map_chara):
+            target = pose_target(selection.profile)
+            for row, entry in pose_entries:
+                module_outputs[row][target] = entry
+    else:
+        for row, entry in pstg_pose.iter_pose_entries(module_table, resolutions):
+            module_outputs[row][pose_target()] = entry
+
+    # Scale TOMLデータの生成
+    logging.info("ScaleTomlデータの変換を開始")
+    for row, entry, rule in pstg_scale.iter_scale_entries(module_table, resolutions, map_chara):
+        module_outputs[row][SCALE_TARGET] = entry
+        scale_sources[row] = (rule.scale_text, pstg_scale.describe_rule(rule))
+
+    return module_outputs, scale_sources
+
+def extract_module_table(dragged_file, app_config):
+    """FARCからモジュールテーブルを抽出し、(モジュールテーブル, 終了コード) を返す (失敗時のモジュールテーブルはNone)"""
+    farc_pack_path = app_config.get('FarcPackPath', '') # FarcPackPath（ネイティブ読み込み非対応時のみ使用）
+
+    # 4. データの抽出（同じFARCの抽出結果がキャッシュにあれば解凍・解析を省略）
+    cache_key = None
+    module_table = None
+    if app_config.get('UseExtractCache', True):
+        cache_key = pstg_cache.compute_farc_fingerprint(dragged_file.strip('{}'))
+        module_table = pstg_cache.load_module_table(app_config, cache_key)
+
+    if module_table is None:
+        # FARCから直接BINデータを読み込む（非対応形式の場合はNone）
+        bin_entries = pstg_farc.read_module_tbl_bins(dragged_file)
+        if bin_entries is None:
+            # FarcPackPathの検証（フォールバック時のみ必要）
+            if not is_valid_farc_pack_path(farc_pack_path):
+                print("有効なFarcPackパスが設定されていません。")
+                return None, EXIT_NO_FARCPACK
+
+            # ファイルをTempにコピーして解凍
+            pstg_farc.process_file(dragged_file, farc_pack_path)
+
+        module_table = pstg_extract.process_data(bin_entries)
+        if module_table and cache_key:
+            pstg_cache.save_module_table(app_config, cache_key, module_table)
+
+    if not module_table:
+        logging.error("データの抽出に失敗しました。処理を中止します。")
+        return None, EXIT_NO_DATA
+    return module_table, EXIT_OK
+
+def resolve_save_directory(dragged_file, app_config, output_dir=None):
+    """Tomlファイルの保存先を決定する (出力先指定 > 親ディレクトリ > FARCと同じディレクトリ)"""
+    dragged_file_dir = os.path.dirname(dragged_file.strip('{}')) # ドラッグ＆ドロップされたファイルのディレクトリ
+    if output_dir:
+        return output_dir
+    if app_config['SaveInParentDirectory']:
+        return os.path.dirname(dragged_file_dir)
+    return dragged_file_dir
+
+def generate_for_archive(dragged_file, app_config, output_dir=None):
+    """1つのFARCからPose/Scale TOMLを生成して保存し、終了コードを返す (output_dir指定時はそこに保存)"""
+    farc_path = dragged_file.strip('{}') # FARCファイルのパス
+    save_directory = resolve_save_directory(dragged_file, app_config, output_dir) # 保存先
+    dump_format = app_config.get('DumpModuleData', 'none') # モジュールデータの保存形式
+
+    # 前回の生成時から入力（FARC・設定ファイル・Generator）と出力が変わっていなければ何もしない
+    if (app_config.get('UseIncrementalBuild', True) and not app_config.get('ForceRebuild', False)
+            and dump_format not in pstg_module_dump.DUMP_FORMATS
+            and pstg_manifest.is_up_to_date(app_config, farc_path, save_directory)):
+        logging.info(f"入力が変更されていないためスキップしました: {farc_path}")
+        print(f"入力が変更されていないためスキップしました: {farc_path}")
+        return EXIT_OK
+
+    module_table, exit_code = extract_module_table(dragged_file, app_config)
+    if module_table is None:
+        return exit_code
+
+    # デバッグ設定で指定された場合のみ抽出結果を保存する（--replayで再生できる）
+    if dump_format in pstg_module_dump.DUMP_FORMATS:
+        dump_path = pstg_module_dump.dump_module_table(module_table, dump_format)
+        print(f"モジュールデータを保存しました: {dump_path}")
+
+    return generate_from_table(module_table, app_config, save_directory, dragged_file, farc_path=farc_path)
+
+def replay_module_dump(dump_path, app_config, output_dir=None):
+    """保存したモジュールデータからPose/Scale TOMLを生成する (出力先の既定はダンプファイルと同じディレクトリ)"""
+    module_table = pstg_module_dump.load_module_dump(dump_path)
+    if not module_table:
+        logging.error("モジュールデータが空のため処理を中止します。")
+        return EXIT_NO_DATA
+    save_directory = output_dir or os.path.dirname(os.path.abspath(dump_path))
+    return generate_from_table(module_table, app_config, save_directory, dump_path)
+
+def generate_from_table(module_table, app_config, save_directory, source_name, farc_path=None):
+    """モジュールテーブルからPose/Scale TOMLを生成してsave_directoryに保存し、終了コードを返す (farc_path指定時はマニフェストを記録する)"""
+    # 5. プロファイルの選択（設定の読み込みとPose TOMLの保存で共通）
+    profile_selections = pstg_profile.select_profiles(module_table, app_config)
+
+    # PoseScale設定の読み込み（設定ファイルが存在しない場合は中止）
+    setting_paths = pstg_loader.get_pose_scale_setting_paths(profile_selections, app_config) # 使用するPoseScale設定ファイル
+    pose_settings = pstg_loader.load_pose_scale_settings(setting_paths) # PoseScale設定の読み込み
+    if not pose_settings:
+        logging.error("有効なPoseScale設定が読み込めませんでした。処理を中止します。")
+        return EXIT_NO_SETTINGS
+
+    # 6. キャラクターマッピングの取得
+    map_chara = pstg_util.load_chara_mapping()
+
+    # 7. 前回の生成結果との差分（設定が同じ場合、変更のないモジュールは前回の出力を再利用する）
+    fingerprint = pstg_incremental.compute_rules_fingerprint(app_config, profile_selections, pose_settings) # 設定の指紋
+    snapshot_path = pstg_incremental.get_snapshot_path(app_config, source_name, save_directory) # スナップショットのパス
+    snapshot = None
+    if app_config.get('UseIncrementalBuild', True) and not app_config.get('ForceRebuild', False):
+        snapshot = pstg_incremental.load_snapshot(snapshot_path, fingerprint)
+    keys = pstg_incremental.module_keys(module_table) # 差分のキー（モジュールID）
+    module_outputs, scale_sources, changed_rows, unchanged = pstg_incremental.reuse_module_outputs(module_table, keys, snapshot)
+    if unchanged and pstg_incremental.are_outputs_current(snapshot):
+        logging.info(f"モジュールと設定に変更がないため保存をスキップしました: {source_name}")
+        if farc_path:
+            pstg_manifest.write_manifest(app_config, farc_path, save_directory, setting_paths, snapshot['files'])
+        return EXIT_OK
+
+    # 8. 追加・変更されたモジュールのみマッチングしてPose/Scale TOMLデータを生成する
+    if changed_rows:
+        if len(changed_rows) == len(module_table):
+            changed_outputs, changed_sources = generate_module_outputs(module_table, profile_selections, pose_settings, app_config, map_chara)
+        else:
+            changed_table = module_table.take(changed_rows) # 追加・変更されたモジュール
+            changed_selections = pstg_profile.select_profiles(changed_table, app_config)
+            changed_outputs, changed_sources = generate_module_outputs(changed_table, changed_selections, pose_settings, app_config, map_chara)
+        for row, outputs, source in zip(changed_rows, changed_outputs, changed_sources):
+            module_outputs[row] = outputs
+            scale_sources[row] = source
+
+    # 9. ファイルの保存
+    # プロファイルごとの保存ロジック（Config依存度が高いためここで処理しつつutilのsaveを呼ぶ)
+
+    overwrite_existing = app_config.get('OverwriteExistingFiles', False) # 上書き保存
+    max_backups = app_config.get('MaxBackups', pstg_backup.DEFAULT_MAX_BACKUPS) # ファイルごとに残すバックアップ数
+    max_backup_bytes = app_config.get('MaxBackupMB', pstg_backup.DEFAULT_MAX_BACKUP_BYTES // (1024 * 1024)) * 1024 * 1024 # バックアップの上限サイズ
+    sort_by_id = app_config.get('SortOutputById', False) # モジュールID順に出力する
+    written_files = {} # 保存するファイルのパス -> 内容のハッシュ（保存に失敗した場合はNone）
+    save_failed = False # 保存に失敗したファイルがあるか
+
+    # マージモードでは既存のPose TOMLに前回からの変更のみを反映する（前回の出力と比べて手動編集を判別する）
+    merge_pose = app_config.get('MergePoseToml', False) # 既存のPose TOMLにマージする
+    previous_outputs = pstg_incremental.load_previous_outputs(snapshot_path, snapshot) if merge_pose else {} # 前回生成したモジュールIDごとの出力
+
+    def pose_emitter(save_path, target):
+        if merge_pose and os.path.exists(save_path):
+            return pstg_merge.PoseTomlMerger(save_path, target, previous_outputs, drop_missing=app_config.get('MergeDropMissing', False), current_ids=module_table.ids)
+        return pstg_emitter.TomlEmitter(save_path, sort_by_id=sort_by_id)
+
+    # 出力先フォルダが存在しない場合は作成する（--output-dirや常駐モードのジョブで指定された場合）
+    try:
+        os.makedirs(save_directory, exist_ok=True)
+    except OSError as e:
+        logging.error(f"出力先フォルダを作成できませんでした: {e}")
+        return EXIT_ERROR
+
+    # 出力先ごとのエミッター（保存順に並べる）
+    emitters = [] # (出力先キー, ラベル, エミッター)
+    if app_config['UseModuleNameContains']:
+        # マッチしたプロファイルごとにPose TOMLを保存
+        for selection in profile_selections:
+            pose_file_name = selection.profile.pose_file_name # Pose TOMLファイル名
+            if not pose_file_name:
+                logging.warning(f"プロファイルにPoseFileNameが設定されていません: {selection.profile.section}")
+                continue
+            save_path = os.path.join(save_directory, f'{pose_file_name}.toml') # 保存パス
+            emitters.append((pose_target(selection.profile), "Pose TOML", pose_emitter(save_path, pose_target(selection.profile))))
+    else:
+        # モジュール名を含まない
+        default_pose_file_name = app_config['DefaultPoseFileName'] # デフォルトPose TOMLファイル名
+        save_path = os.path.join(save_directory, f'{default_pose_file_name}.toml') # 保存パス
+        emitters.append((pose_target(), "Pose TOML", pose_emitter(save_path, pose_target())))
+
+    # Scale TOMLは常に保存
+    scale_file_name = 'scale_db.toml' # Scale TOMLファイル名
+    save_path_scale = os.path.join(save_directory, scale_file_name) # 保存パス
+    emitters.append((SCALE_TARGET, "Scale TOML", pstg_emitter.TomlEmitter(save_path_scale, sort_by_id=sort_by_id)))
+
+    try:
+        # モジュールの順にエントリを各出力先へ書き込む（出力全体を文字列として保持しない）
+        emitters_by_target = {} # 出力先キー -> エミッター
+        for target, _, emitter in emitters:
+            emitters_by_target.setdefault(target, []).append(emitter)
+        # Scale TOMLは (キャラクター, COS値) ごとに索引し、同じスケールの重複のみ1つにまとめる（異なるスケールのエントリはすべて残す）
+        scale_index = pstg_scale.ScaleEntryIndex()
+        scale_chara_values = module_table.map_charas(map_chara, "module_to_cos_scale") # Scale TOMLのキャラクター値
+        scale_keys = [(scale_chara_values[row], module_table.cos[row]) for row in range(len(module_table))] # 行ごとの (キャラクター, COS値)
+        for row, outputs in enumerate(module_outputs):
+            if SCALE_TARGET in outputs:
+                scale_index.add(scale_keys[row], scale_sources[row], module_table.names[row])
+        module_ids = module_table.ids
+        for row, outputs in enumerate(module_outputs):
+            for target, entry in outputs.items():
+                if target == SCALE_TARGET and not scale_index.should_emit(scale_keys[row], scale_sources[row]):
+                    continue
+                for emitter in emitters_by_target.get(target, ()):
+                    emitter.push(entry, module_ids[row])
+        scale_index.log_summary()
+
+        for _, label, emitter in emitters:
+            if emitter.count == 0:
+                logging.info(f"{label}の内容が空のため、生成をスキップしました: {emitter.file_path}")
+                continue
+            # 内容が同じ場合は書き込まない（保存に失敗したファイルはハッシュをNoneとして記録し、次回再生成する）
+            content_hash = emitter.finish(overwrite=overwrite_existing, max_backups=max_backups, max_backup_bytes=max_backup_bytes) # TOML保存
+            written_files[emitter.file_path] = content_hash
+            if content_hash is None:
+                save_failed = True
+    finally:
+        for _, _, emitter in emitters:
+            emitter.discard()
+
+    # 次回の差分生成のためにスナップショットを保存する
+    if keys is not None:
+        pstg_incremental.save_snapshot(snapshot_path, fingerprint, module_table, keys, module_outputs, scale_sources, written_files)
+    if farc_path:
+        pstg_manifest.write_manifest(app_config, farc_path, save_directory, setting_paths, written_files)
+
+    if save_failed:
+        logging.error(f"保存に失敗したファイルがあります: {source_name}")
+        return EXIT_ERROR
+    logging.info(f"全処理が完了しました: {source_name}")
+    return EXIT_OK
@@ -0,0 +1,132 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+import pstg_loader
+import pstg_manifest
+
+SNAPSHOT_FORMAT_VERSION = 3 # スナップショット形式のバージョン（形式や出力内容を変更した場合は更新する）
+
+def get_snapshot_dir(app_config):
+    """スナップショットのディレクトリパスを取得"""
+    return os.path.join(app_config['SettingsDir'], 'Cache', 'Snapshots')
+
+def get_snapshot_path(app_config, source_path, save_directory):
+    """FARCと保存先の組み合わせごとのスナップショットのパスを取得"""
+    key = f"{os.path.normcase(os.path.abspath(source_path.strip('{}')))}|{os.path.normcase(os.path.abspath(save_directory))}"
+    path_hash = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(get_snapshot_dir(app_config), f'{path_hash}.bin')
+
+def _rule_signature(rule):
+    """出力に影響する設定の内容"""
+    return (rule.source, rule.section, rule.chara, tuple(rule.includes), tuple(rule.excludes), rule.is_fallback, rule.pose_id, rule.scale_text)
+
+def compute_rules_fingerprint(app_config, profile_selections, pose_settings):
+    """出力に影響する設定（PoseScale設定・マッチしたプロファイル）から指紋を生成する"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(repr((SNAPSHOT_FORMAT_VERSION, app_config['UseModuleNameContains'], app_config['DefaultPoseFileName'], app_config.get('SortOutputById', False), app_config.get('MergePoseToml', False), app_config.get('MergeDropMissing', False))).encode('utf-8'))
+    for rule in pose_settings:
+        hasher.update(repr(_rule_signature(rule)).encode('utf-8'))
+    for selection in profile_selections:
+        profile = selection.profile
+        hasher.update(repr((profile.section, tuple(profile.includes), tuple(profile.excludes), profile.config_file, profile.pose_file_name)).encode('utf-8'))
+        for rule in pstg_loader.load_profile_settings(profile, app_config):
+            hasher.update(repr(_rule_signature(rule)).encode('utf-8'))
+    return hasher.hexdigest()
+
+def module_keys(module_table):
+    """モジュールIDを差分のキーとして返す (IDが重複する場合は差分を取れないためNone)"""
+    keys = [str(module_id) for module_id in module_table.ids]
+    if len(set(keys)) != len(keys):
+        logging.info("モジュールIDが重複しているため差分生成を使用しません")
+        return None
+    return keys
+
+def _read_snapshot(snapshot_path):
+    """スナップショットを読み込む (存在しない・読み込めない・形式が異なる場合はNone)"""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            snapshot = json.loads(zlib.decompress(snapshot_file.read()).decode('utf-8'))
+    except (OSError, ValueError, zlib.error) as e:
+        logging.warning(f"スナップショットの読み込みに失敗しました (無視します): {e}")
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return snapshot
+
+def load_snapshot(snapshot_path, fingerprint):
+    """前回の生成結果を読み込む (存在しない・設定が変更された場合はNone)"""
+    snapshot = _read_snapshot(snapshot_path)
+    if snapshot is None:
+        return None
+    if snapshot.get('fingerprint') != fingerprint:
+        logging.info("PoseScale設定が変更されたため全モジュールを再マッチングします")
+        return None
+    return snapshot
+
+def load_previous_outputs(snapshot_path, snapshot=None):
+    """前回生成したモジュールIDごとの出力を返す (設定が変更されていても読み込む、前回の結果がない場合は空)"""
+    if snapshot is None:
+        snapshot = _read_snapshot(snapshot_path)
+    if snapshot is None:
+        return {}
+    return {key: previous[3] for key, previous in snapshot['modules'].items()}
+
+def save_snapshot(snapshot_path, fingerprint, module_table, keys, module_outputs, scale_sources, written_files):
+    """今回の生成結果をスナップショットとして保存する"""
+    modules = {} # モジュールID -> [キャラクター, COS値, モジュール名, 出力, Scaleの決定元]
+    for row, key in enumerate(keys):
+        modules[key] = [module_table.chara(row), module_table.cos[row], module_table.names[row], module_outputs[row], scale_sources[row]]
+    snapshot = {
+        "version": SNAPSHOT_FORMAT_VERSION, # スナップショット形式のバージョン
+        "fingerprint": fingerprint, # 設定の指紋
+        "modules": modules, # モジュールごとの入力と出力
+        "files": written_files # 保存するファイルのパスと内容のハッシュ（保存に失敗した場合はNone）
+    }
+    temp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(zlib.compress(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8')))
+        os.replace(temp_path, snapshot_path)
+    except OSError as e:
+        logging.warning(f"スナップショットの保存に失敗しました (無視します): {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def reuse_module_outputs(module_table, keys, snapshot):
+    """前回から変更のないモジュールの出力を再利用し、(モジュールごとの出力, Scaleの決定元, 再マッチングが必要な行, 全体に変更がないか) を返す"""
+    if snapshot is None or keys is None:
+        return [None] * len(module_table), [None] * len(module_table), list(range(len(module_table))), False
+
+    previous_modules = snapshot['modules'] # 前回のモジュールID -> [キャラクター, COS値, モジュール名, 出力, Scaleの決定元]
+    module_outputs = [] # モジュールごとの出力（再マッチングが必要な行はNone）
+    scale_sources = [] # モジュールごとのScaleの決定元
+    changed_rows = [] # 追加・変更されたモジュールの行
+    for row, key in enumerate(keys):
+        previous = previous_modules.get(key)
+        if previous is not None and previous[0] == module_table.chara(row) and previous[1] == module_table.cos[row] and previous[2] == module_table.names[row]:
+            module_outputs.append(previous[3])
+            scale_sources.append(previous[4])
+        else:
+            module_outputs.append(None)
+            scale_sources.append(None)
+            changed_rows.append(row)
+
+    # 削除されたモジュールがあれば出力の内容が変わる
+    unchanged = not changed_rows and len(previous_modules) == len(keys)
+    logging.info(f"前回からの差分: 変更・追加 {len(changed_rows)} 件 / 全 {len(keys)} 件")
+    return module_outputs, scale_sources, changed_rows, unchanged
+
+def is_file_current(snapshot, file_path):
+    """保存済みのファイルが前回の出力のままか判定する (前回保存に失敗したファイルは常に再生成する)"""
+    recorded_hash = snapshot['files'].get(file_path)
+    return recorded_hash is not None and pstg_manifest.hash_file(file_path) == recorded_hash
+
+def are_outputs_current(snapshot):
+    """前回保存した全ファイルが変更・削除されていないか判定する"""
+    return all(is_file_current(snapshot, file_path) for file_path in snapshot['files'])
@@ -1,10 +1,13 @@
 import os
 import configparser
 import logging
-from pstg_util import get_app_dir, is_match
+from pstg_util import get_app_dir
+from pstg_rule import compile_rule
 
-def load_pose_scale_settings(module_data, app_config):
-    """プロファイルとモジュールデータに基づいてPoseScale設定を読み込む"""
+_setting_file_cache = {} # 読み込み済みPoseScale設定ファイル（パス -> (更新日時, サイズ, 解析済み設定リスト)）
+
+def get_pose_data_dir(app_config):
+    """PoseScaleDataディレクトリのパスを取得"""
     app_dir = get_app_dir() # アプリケーションのディレクトリ
     settings_dir = app_config.get('SettingsDir', os.path.join(app_dir, 'Settings')) # 設定ディレクトリ
     
@@ -12,54 +15,89 @@ def load_pose_scale_settings(module_data, app_config):
     pose_data_dir = os.path.join(settings_dir, 'PoseScaleData') # PoseScaleDataのディレクトリ
     if not os.path.exists(pose_data_dir): # PoseScaleDataのディレクトリが存在しない場合
         pose_data_dir = os.path.join(app_dir, 'PoseScaleData') # PoseScaleDataのディレクトリ
+    return pose_data_dir
+
+def load_setting_file(config_file_path):
+    """PoseScale設定ファイルを読み込んで解析済みの設定を返す (同じプロセス内では更新されていない限り再解析しない)"""
+    stat = os.stat(config_file_path)
+    cached = _setting_file_cache.get(config_file_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        logging.debug(f"読み込み済みの設定ファイルを再利用します: {config_file_path}")
+        return cached[2]
+
+    # 設定ファイルを読み込む
+    config_pose = configparser.ConfigParser()
+    try: # 設定ファイルを読み込む
+        config_pose.read(config_file_path, encoding='utf-8-sig')
+    except UnicodeDecodeError: # 設定ファイルを読み込む
+        logging.warning(f"UTF-8での読み込みに失敗しました。cp932で再試行します: {config_file_path}")
+        config_pose.read(config_file_path, encoding='cp932')
+
+    source = os.path.basename(config_file_path) # 設定ファイル名
+    settings = [] # 設定ファイル内のPoseScale設定
+    # 読み込んだ設定ファイルを走査
+    for section in config_pose.sections():
+        # PoseScale設定セクションを走査
+        if section.startswith('PoseScaleSetting_'):
+            # PoseScale設定を読み込む
+            setting = {
+                "Chara": config_pose.get(section, "Chara", fallback=None), # キャラクター名
+                "ModuleNameContains": config_pose.get(section, "ModuleNameContains", fallback=None), # モジュール名を含むか
+                "ModuleExclude": config_pose.get(section, "ModuleExclude", fallback=None), # モジュール名を除外する
+                "PoseID": config_pose.get(section, "PoseID", fallback=None), # ポーズID
+                "Scale": config_pose.get(section, "Scale", fallback=None) # スケール
+            }
+            rule = compile_rule(source, section, setting) # キーワード分割・型変換を済ませた設定
+            settings.append(rule) # settingsに追加
+            logging.debug(f"セクションの設定を読み込みます {section}: {rule}")
+
+    _setting_file_cache[config_file_path] = (stat.st_mtime_ns, stat.st_size, settings)
+    return settings
+
+def preload_setting_files(app_config):
+    """PoseScaleDataディレクトリ内の全設定ファイルを読み込み、読み込み済みキャッシュを返す"""
+    pose_data_dir = get_pose_data_dir(app_config)
+    if os.path.isdir(pose_data_dir):
+        for file_name in os.listdir(pose_data_dir):
+            if file_name.endswith('.ini'):
+                load_setting_file(os.path.join(pose_data_dir, file_name))
+    return dict(_setting_file_cache)
+
+def seed_setting_file_cache(setting_file_cache):
+    """他のプロセスで読み込み済みの設定ファイルキャッシュを取り込む"""
+    _setting_file_cache.update(setting_file_cache)
+
+def get_profile_setting_path(profile, app_config):
+    """プロファイルのConfigFileで指定されたPoseScale設定ファイルのパス (未設定の場合はNone)"""
+    if not profile.config_file:
+        return None
+    return os.path.join(get_pose_data_dir(app_config), f"{profile.config_file}.ini")
 
-    config_profile = app_config.get('ProfileConfig', app_config['ConfigParser']) # 設定ファイル
+def load_profile_settings(profile, app_config):
+    """プロファイルのConfigFileで指定されたPoseScale設定のみを読み込む"""
+    config_file_path = get_profile_setting_path(profile, app_config)
+    if config_file_path is None:
+        return []
+    if not os.path.exists(config_file_path): # 設定ファイルが存在しない場合
+        logging.warning(f"プロファイルの設定ファイルが存在しません: {profile.section} -> {config_file_path}")
+        return []
+    return load_setting_file(config_file_path)
+
+def get_pose_scale_setting_paths(profile_selections, app_config):
+    """選択されたプロファイルに基づいて読み込むPoseScale設定ファイルのパスを返す"""
+    pose_data_dir = get_pose_data_dir(app_config) # PoseScaleDataのディレクトリ
     use_module_name_contains = app_config['UseModuleNameContains'] # モジュール名を含むか
-    
-    pose_settings = [] # PoseScale設定
     config_files_to_read = [] # 読み込む設定ファイル
 
-    # プロファイル選択は「いずれかのキーワードが含まれるか (OR)」で判定
     if use_module_name_contains:
-        # プロファイル選択は「いずれかのキーワードが含まれるか (OR)」で判定
-        for section in config_profile.sections():
-            if section.startswith('TomlProfile_'):
-                # プロファイル選択は「いずれかのキーワードが含まれるか (OR)」で判定
-                match_str = config_profile.get(section, 'ModuleMatch', fallback='')
-                match_keywords = [m.strip() for m in match_str.split(',') if m.strip()]
-                
-                # プロファイル選択は「いずれかのキーワードが含まれるか (OR)」で判定
-                exclude_str = config_profile.get(section, 'ModuleExclude', fallback='')
-                exclude_keywords = [m.strip() for m in exclude_str.split(',') if m.strip()]
-                
-                logging.debug(f"Checking Profile: {section}, Keywords: {match_keywords}, Exclude: {exclude_keywords}")
-
-                # モジュールデータ内にマッチするキーワードがあるか確認
-                is_profile_match = False
-                for module in module_data: # モジュールデータを走査
-                    name = module.get('name', '')
-                    
-                    # Check Exclude first（除外キーワードがあるか確認）
-                    if any(ex in name for ex in exclude_keywords):
-                        continue
-
-                    # プロファイル選択は「いずれかのキーワードが含まれるか (OR)」で判定
-                    if any(k in name for k in match_keywords):
-                        logging.debug(f"  Match found! Module: {name} contains one of {match_keywords}")
-                        is_profile_match = True
-                        break
-                
-                if not is_profile_match:
-                     # マッチしなかった場合、最初の数件のモジュール名をログに出して確認
-                     sample_names = [m.get('name', '') for m in module_data[:3]]
-                     logging.debug(f"  No match in profile {section}. Sample module names: {sample_names}")
-                
-                if is_profile_match: # マッチした場合
-                    config_file_base = config_profile[section]['ConfigFile']
-                    config_files_to_read.append(f"{config_file_base}.ini")
-                    logging.info(f"Profile matched: {section} -> Loading {config_file_base}.ini")
-                else:
-                    logging.info(f"Profile skipped (no match in module data): {section}")
+        # マッチしたプロファイルの設定ファイルを読み込む
+        for selection in profile_selections:
+            config_file_base = selection.profile.config_file
+            if not config_file_base:
+                logging.warning(f"プロファイルにConfigFileが設定されていません: {selection.profile.section}")
+                continue
+            config_files_to_read.append(f"{config_file_base}.ini")
+            logging.info(f"Profile matched: {selection.profile.section} -> Loading {config_file_base}.ini")
         
         # Always append PoseScaleData.ini as a fallback if UseModuleNameContains is True
         # This ensures modules that didn't match any profile can still be handled by default settings
@@ -70,38 +108,20 @@ def load_pose_scale_settings(module_data, app_config):
     else:
         config_files_to_read.append('PoseScaleData.ini')
 
+    return [os.path.join(pose_data_dir, config_file) for config_file in config_files_to_read]
+
+def load_pose_scale_settings(config_file_paths):
+    """get_pose_scale_setting_pathsで求めたPoseScale設定ファイルを読み込む"""
+    pose_settings = [] # PoseScale設定
+
     # 読み込む設定ファイルを走査
-    for config_file in config_files_to_read:
-        config_file_path = os.path.join(pose_data_dir, config_file)
-        
+    for config_file_path in config_file_paths:
         # 設定ファイルが存在しない場合
         if not os.path.exists(config_file_path):
             continue
             
         logging.info(f"使用するconfig file: {config_file_path}")
-        
-        # 設定ファイルを読み込む
-        config_pose = configparser.ConfigParser()
-        try: # 設定ファイルを読み込む
-            config_pose.read(config_file_path, encoding='utf-8-sig')
-        except UnicodeDecodeError: # 設定ファイルを読み込む
-            logging.warning(f"UTF-8での読み込みに失敗しました。cp932で再試行します: {config_file_path}")
-            config_pose.read(config_file_path, encoding='cp932')
-
-        # 読み込んだ設定ファイルを走査
-        for section in config_pose.sections():
-            # PoseScale設定セクションを走査
-            if section.startswith('PoseScaleSetting_'):
-                # PoseScale設定を読み込む
-                setting = {
-                    "Chara": config_pose.get(section, "Chara", fallback=None), # キャラクター名
-                    "ModuleNameContains": config_pose.get(section, "ModuleNameContains", fallback=None), # モジュール名を含むか
-                    "ModuleExclude": config_pose.get(section, "ModuleExclude", fallback=None), # モジュール名を除外する
-                    "PoseID": config_pose.get(section, "PoseID", fallback=None), # ポーズID
-                    "Scale": config_pose.get(section, "Scale", fallback=None) # スケール
-                }
-                pose_settings.append(setting) # pose_settingsに追加
-                logging.debug(f"セクションの設定を読み込みます {section}: {setting}")
+        pose_settings.extend(load_setting_file(config_file_path)) # pose_settingsに追加
 
     logging.info(f"pose_settings を正常に読み込みました。件数: {len(pose_settings)}")
     return pose_settings
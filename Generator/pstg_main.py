@@ -2,12 +2,14 @@ import os
 import logging
 import subprocess
 import sys
+import multiprocessing
+import pstg_batch
 import pstg_config
+import pstg_daemon
 import pstg_farc
-import pstg_extract
-import pstg_loader
-import pstg_pose
-import pstg_scale
+import pstg_generate
+import pstg_scan
+import pstg_settings_cache
 import pstg_util
 
 def launch_editor():
@@ -37,39 +39,25 @@ def launch_editor():
 
 # メイン処理
 def main():
+    interactive = True # 対話的に実行されているか（バッチモードでは入力待ちをしない）
     try:
         # 1. 設定の読み込み
-        app_config = pstg_config.load_app_config()
+        app_config = pstg_settings_cache.load_settings()
         
         # Config.iniが存在しない、または読み込み失敗した場合
         if not app_config:
             print("設定ファイルが見つかりません。")
             launch_editor()
-            return
-
-        # FarcPackPathの検証
-        farc_pack_path = app_config.get('FarcPackPath', '')
-        if not farc_pack_path or not os.path.exists(farc_pack_path) or not os.path.basename(farc_pack_path).lower() == 'farcpack.exe':
-            print("有効なFarcPackパスが設定されていません。")
-            launch_editor()
-            return
+            return pstg_generate.EXIT_NO_SETTINGS
 
         # 2. ログの初期化（削除予定）
         # debug_settings = app_config['DebugSettings'] 
         
-        # DebugSettingsの読み込み
-        # app_configにはConfigParserオブジェクトが含まれている
-        config_parser = app_config['ConfigParser']
-        
-        show_debug = config_parser.getboolean('DebugSettings', 'ShowDebugSettings', fallback=False)
+        # DebugSettingsの読み込み（デバッグ設定が非表示の場合、デフォルト値を強制的に使用する）
+        pstg_config.apply_debug_settings(app_config)
         output_log = app_config.get('OutputLog', False)
         delete_temp = app_config.get('DeleteTemp', True)
 
-        if not show_debug:
-            # デバッグ設定が非表示の場合、デフォルト値を強制的に使用する
-            output_log = False
-            delete_temp = True
-            
         pstg_util.setup_logging(output_log=output_log)
         
         # プログラム開始ログ
@@ -79,99 +67,63 @@ def main():
         if len(sys.argv) < 2:
             print("Usage: Drag and drop a file onto this executable, or use the 'Send to' menu.")
             input("Press Enter to exit...")
-            return
-
-        dragged_file = pstg_farc.get_dragged_file() # ドラッグ＆ドロップされたファイルのパス
+            return pstg_generate.EXIT_OK
+
+        args = pstg_batch.parse_args(sys.argv[1:]) # コマンドライン引数
+        if args.dump_module_data:
+            # コマンドライン指定を優先する
+            app_config['DumpModuleData'] = args.dump_module_data
+            delete_temp = pstg_config.keep_temp_for_dump(app_config)['DeleteTemp']
+        if args.force:
+            app_config['ForceRebuild'] = True # 前回の生成結果を使用せずに全モジュールを再生成する
+
+        # 常駐モードの起動・停止
+        if args.serve:
+            interactive = False
+            return pstg_daemon.serve(app_config, port=args.port, delete_temp=delete_temp)
+        if args.stop:
+            interactive = False
+            response = pstg_daemon.send_request({"command": "shutdown"}, args.port or pstg_daemon.get_port(app_config))
+            return pstg_generate.EXIT_OK if response else pstg_generate.EXIT_ERROR
+
+        # 保存したモジュールデータから再生する（FARCの解凍・解析を省略）
+        if args.replay_file:
+            interactive = False
+            return pstg_generate.replay_module_dump(args.replay_file, app_config, output_dir=args.output_dir)
+
+        # フォルダが指定された場合は配下の全gm_module_tblを処理する
+        if args.scan_root:
+            interactive = False
+            return pstg_scan.run_scan(args.scan_root, app_config, workers=args.workers, delete_temp=delete_temp, force=args.force)
+
+        # 複数ファイルまたはリストファイルが指定された場合はバッチモードで処理する
+        if pstg_batch.is_batch_args(args):
+            interactive = False
+            farc_paths = pstg_batch.collect_archive_paths(args)
+            results = pstg_batch.run_batch(farc_paths, app_config, workers=args.workers, delete_temp=delete_temp)
+            return pstg_batch.report_results(results)
+
+        dragged_file = pstg_farc.get_dragged_file(args.files) # ドラッグ＆ドロップされたファイルのパス
+
+        # 常駐プロセスが起動していれば処理を依頼する（起動していない場合はこのプロセスで処理）
+        if app_config.get('UseDaemon', False):
+            exit_code = pstg_daemon.submit_job(dragged_file, app_config, output_dir=args.output_dir, force=args.force, dump_module_data=args.dump_module_data)
+            if exit_code is not None:
+                return exit_code
         
-        # ファイルをTempにコピーして解凍
-        dragged_file_dir = pstg_farc.process_file(dragged_file, farc_pack_path)
-
-        # 4. データの抽出
-        module_data = pstg_extract.process_data()
-        if not module_data:
-            logging.error("データの抽出に失敗しました。処理を中止します。")
-            return
-
-        # 5. PoseScale設定の読み込み（設定ファイルが存在しない場合は設定エディタを起動して終了）
-        pose_settings = pstg_loader.load_pose_scale_settings(module_data, app_config) # PoseScale設定の読み込み
-        if not pose_settings:
-            logging.error("有効なPoseScale設定が読み込めませんでした。処理を中止します。")
+        exit_code = pstg_generate.generate_for_archive(dragged_file, app_config, output_dir=args.output_dir)
+        if exit_code in (pstg_generate.EXIT_NO_SETTINGS, pstg_generate.EXIT_NO_FARCPACK):
             launch_editor() # 設定エディタを起動
-            return
-
-        # 6. キャラクターマッピングの取得
-        map_chara = pstg_util.load_chara_mapping()
-
-        # 7. Pose TOMLの生成
-        pose_toml_entries = pstg_pose.generate_pose_toml(module_data, pose_settings, map_chara) 
-
-        # 8. Scale TOMLの生成
-        scale_toml_entries = pstg_scale.generate_scale_toml(module_data, pose_settings, map_chara)
-
-        # 9. ファイルの保存
-        save_directory = dragged_file_dir
-        if app_config['SaveInParentDirectory']:
-            save_directory = os.path.dirname(dragged_file_dir)
-
-        # プロファイルごとの保存ロジック（Config依存度高いためmainで処理しつつutilのsaveを呼ぶ)
-        
-        use_module_name_contains = app_config['UseModuleNameContains'] # モジュール名を含むか
-        overwrite_existing = app_config.get('OverwriteExistingFiles', False) # 上書き保存
-        config_profile = app_config.get('ProfileConfig', app_config['ConfigParser']) # ConfigParser
-
-        # プロファイルごとの保存
-        if use_module_name_contains:
-            # モジュール名を含むか
-            for section in config_profile.sections():
-                # TomlProfile_で始まるセクション
-                if section.startswith('TomlProfile_'):
-                    match_str = config_profile.get(section, 'ModuleMatch', fallback='')
-                    exclude_str = config_profile.get(section, 'ModuleExclude', fallback='')
-                    
-                    # モジュールデータ内にマッチするキーワードがあるか確認
-                    is_match = False
-                    # モジュールデータ内を走査
-                    for module in module_data:
-                        if pstg_util.is_match(module.get('name', ''), match_str, exclude_str):
-                            is_match = True
-                            break
-                    
-                    # マッチする場合
-                    if is_match:
-                        pose_file_name = config_profile[section]['PoseFileName'] # Pose TOMLファイル名
-                        save_path = os.path.join(save_directory, f'{pose_file_name}.toml') # 保存パス
-                        
-                        if pose_toml_entries:
-                            pstg_util.save_file_with_timestamp(save_path, '\n'.join(pose_toml_entries), overwrite=overwrite_existing) # Pose TOML保存
-                        else:
-                            logging.info(f"Pose TOMLの内容が空のため、生成をスキップしました: {save_path}")
-        else:
-            # モジュール名を含まない
-            default_pose_file_name = app_config['DefaultPoseFileName'] # デフォルトPose TOMLファイル名
-            save_path = os.path.join(save_directory, f'{default_pose_file_name}.toml') # 保存パス
-            
-            if pose_toml_entries:
-                pstg_util.save_file_with_timestamp(save_path, '\n'.join(pose_toml_entries), overwrite=overwrite_existing) # Pose TOML保存
-            else:
-                logging.info(f"Pose TOMLの内容が空のため、生成をスキップしました: {save_path}")
-
-        # Scale TOMLは常に保存
-        scale_file_name = 'scale_db.toml' # Scale TOMLファイル名
-        save_path_scale = os.path.join(save_directory, scale_file_name) # 保存パス
-        
-        if scale_toml_entries:
-            pstg_util.save_file_with_timestamp(save_path_scale, '\n'.join(scale_toml_entries), overwrite=overwrite_existing) # Scale TOML保存
-        else:
-             logging.info(f"Scale TOMLの内容が空のため、生成をスキップしました: {save_path_scale}")
-
-        logging.info("全処理が完了しました")
+        return exit_code
 
     except Exception as e:
         logging.error(f"予期せぬエラーが発生しました: {e}")
         print(f"予期せぬエラーが発生しました: {e}")
         import traceback
         traceback.print_exc()
-        input("Enterキーを押して終了してください...")
+        if interactive:
+            input("Enterキーを押して終了してください...")
+        return pstg_generate.EXIT_ERROR
     finally:
         # 10. クリーンアップ (デバッグ設定に基づく)
         # app_config might be None if load failed, so check carefully
@@ -185,4 +137,5 @@ def main():
             logging.info("デバッグ設定によりTempフォルダの削除をスキップしました")
 
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support() # PyInstallerでビルドした実行ファイルでプロセスプールを使用するため
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from pstg_util import get_app_dir
+
+MANIFEST_FORMAT_VERSION = 2 # マニフェスト形式のバージョン
+GENERATOR_VERSION = 'beta3' # Generatorのバージョン（コードの変更はファイルの状態からも検出する）
+HASH_CHUNK_SIZE = 1024 * 1024 # ハッシュ計算時の読み込みサイズ
+
+def get_manifest_dir(app_config):
+    """マニフェストのディレクトリパスを取得"""
+    return os.path.join(app_config['SettingsDir'], 'Cache', 'Manifests')
+
+def get_manifest_path(app_config, farc_path, save_directory):
+    """FARCと保存先の組み合わせごとのマニフェストのパスを取得"""
+    key = f"{os.path.normcase(os.path.abspath(farc_path))}|{os.path.normcase(os.path.abspath(save_directory))}"
+    path_hash = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(get_manifest_dir(app_config), f'{path_hash}.json')
+
+def hash_file(file_path):
+    """ファイル内容のハッシュ (存在しない場合はNone)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, 'rb') as target_file:
+            for chunk in iter(lambda: target_file.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+def compute_generator_signature():
+    """Generatorのバージョンと実行中のコード（実行ファイルまたはpstg_*.py）の状態"""
+    if getattr(sys, 'frozen', False):
+        code_files = [sys.executable]
+    else:
+        code_dir = os.path.dirname(os.path.abspath(__file__))
+        code_files = [os.path.join(code_dir, name) for name in sorted(os.listdir(code_dir)) if name.startswith('pstg_') and name.endswith('.py')]
+
+    hasher = hashlib.blake2b(digest_size=16)
+    for code_file in code_files:
+        try:
+            stat = os.stat(code_file)
+            hasher.update(f"{os.path.basename(code_file)}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+        except OSError:
+            continue
+    return f"{GENERATOR_VERSION}:{hasher.hexdigest()}"
+
+def get_config_paths(app_config):
+    """出力に影響する設定ファイル (Config.iniはSettings、なければrootから読み込まれるため両方を対象にする)"""
+    settings_dir = app_config['SettingsDir']
+    return [
+        os.path.join(settings_dir, 'Config.ini'),
+        os.path.join(get_app_dir(), 'Config.ini'),
+        os.path.join(settings_dir, 'TomlProfile.ini')
+    ]
+
+def _file_record(file_path, content_hash=None):
+    """ファイルのサイズ・更新日時・内容ハッシュ (存在しない場合はNone、content_hashを指定した場合はハッシュ計算を省略する)"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, content_hash or hash_file(file_path)]
+
+def _is_file_current(file_path, recorded):
+    """ファイルが記録時から変更されていないか判定する（サイズと更新日時が同じ場合はハッシュ計算を省略する）"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return recorded is None # 記録時も存在しなかった場合は変更なし
+    if recorded is None or stat.st_size != recorded[0]:
+        return False
+    if stat.st_mtime_ns == recorded[1]:
+        return True
+    return hash_file(file_path) == recorded[2]
+
+def write_manifest(app_config, farc_path, save_directory, setting_paths, written_files):
+    """生成に使用した入力と保存したファイルのハッシュをマニフェストに記録する (written_filesは保存するファイルのパス -> ハッシュ、失敗した場合はNone)"""
+    manifest_path = get_manifest_path(app_config, farc_path, save_directory)
+    input_paths = get_config_paths(app_config) + list(setting_paths)
+    manifest = {
+        "version": MANIFEST_FORMAT_VERSION, # マニフェスト形式のバージョン
+        "generator": compute_generator_signature(), # Generatorのバージョン
+        "farc": _file_record(farc_path), # FARCのサイズ・更新日時・内容ハッシュ
+        "inputs": {path: _file_record(path) for path in dict.fromkeys(input_paths)}, # 設定ファイルのサイズ・更新日時・内容ハッシュ（存在しない場合はNone）
+        "outputs": {path: _file_record(path, content_hash) if content_hash is not None else None for path, content_hash in written_files.items()} # 保存したファイルのサイズ・更新日時・内容ハッシュ（保存に失敗した場合はNone）
+    }
+    temp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False)
+        os.replace(temp_path, manifest_path)
+    except OSError as e:
+        logging.warning(f"マニフェストの保存に失敗しました (無視します): {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def is_up_to_date(app_config, farc_path, save_directory):
+    """前回の生成時からFARC・設定ファイル・Generator・出力ファイルがすべて変更されていないか判定する"""
+    try:
+        with open(get_manifest_path(app_config, farc_path, save_directory), 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return False
+
+    if manifest.get('version') != MANIFEST_FORMAT_VERSION or manifest.get('generator') != compute_generator_signature():
+        return False
+    if manifest['farc'] is None or not _is_file_current(farc_path, manifest['farc']):
+        return False
+    # 設定ファイルは記録時に存在しなかったものも含めて比較する（追加・削除も検出する）
+    for path, recorded in manifest['inputs'].items():
+        if not _is_file_current(path, recorded):
+            logging.debug(f"設定ファイルが変更されています: {path}")
+            return False
+    # 出力ファイルが削除・編集された場合、前回保存に失敗した場合は再生成する
+    for path, recorded in manifest['outputs'].items():
+        if recorded is None or not _is_file_current(path, recorded):
+            logging.debug(f"出力ファイルが変更されています: {path}")
+            return False
+    return True
@@ -0,0 +1,121 @@
+from collections import deque
+
+# 複数キーワードを一度の走査で検出するオートマトン（Aho-Corasick法）
+class KeywordAutomaton:
+    # 初期化（キーワードのリストからオートマトンを構築する）
+    def __init__(self, keywords):
+        self._goto = [{}] # 状態遷移（状態番号 -> {文字: 次の状態}）
+        self._fail = [0] # 失敗時の遷移先
+        self._output = [set()] # 各状態で検出されるキーワード番号
+        for keyword_id, keyword in enumerate(keywords):
+            self._add(keyword_id, keyword)
+        self._build_failure_links()
+        self._always = frozenset(self._output[0]) # 空文字列のキーワードはどの名前にも含まれる
+
+    # キーワードを木に追加
+    def _add(self, keyword_id, keyword):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+        self._output[state].add(keyword_id)
+
+    # 失敗時の遷移先を幅優先で計算し、検出キーワードを引き継ぐ
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+        # 検索時に集合演算しやすいようfrozensetに変換する
+        self._output = [frozenset(output) for output in self._output]
+
+    # テキストに含まれるキーワード番号の集合を返す
+    def find(self, text):
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set(self._always)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+# PoseScale設定をモジュール名で検索するマッチャー（名前を一度走査するだけで候補の設定を求める）
+class RuleMatcher:
+    # 初期化（全設定の含む・除外キーワードから1つのオートマトンを構築する）
+    def __init__(self, rules):
+        self.rules = list(rules) # 設定（ファイル順）
+        keyword_ids = {} # キーワード -> キーワード番号
+
+        def to_ids(keywords):
+            return frozenset(keyword_ids.setdefault(keyword, len(keyword_ids)) for keyword in keywords)
+
+        self._exclude_ids = [] # 設定ごとの除外キーワード番号
+        self._rules_by_include = {} # 含むキーワード番号 -> そのキーワードを持つSpecific設定の位置
+        self._fallback_positions = [] # Fallback設定の位置（ファイル順）
+        for position, rule in enumerate(self.rules):
+            self._exclude_ids.append(to_ids(rule.excludes))
+            if rule.is_fallback:
+                self._fallback_positions.append(position)
+            else:
+                for keyword_id in to_ids(rule.includes):
+                    self._rules_by_include.setdefault(keyword_id, []).append(position)
+
+        self._automaton = KeywordAutomaton(keyword_ids.keys()) # dictは挿入順のためキーワード番号と一致する
+
+    # モジュール名で発動する設定の位置を返す (Specific設定のみ、除外キーワードを考慮)
+    def triggered(self, name, found=None):
+        if found is None:
+            found = self._automaton.find(name)
+        positions = set()
+        for keyword_id in found:
+            for position in self._rules_by_include.get(keyword_id, ()):
+                if not (self._exclude_ids[position] & found):
+                    positions.add(position)
+        return positions
+
+    # モジュール名に最初にマッチする設定を返す（Specific優先、同種内はファイル順）
+    def match(self, name):
+        found = self._automaton.find(name)
+
+        # First pass: Specific matches (ModuleNameContains is set)（特定のマッチング）
+        triggered = self.triggered(name, found)
+        if triggered:
+            return self.rules[min(triggered)], "Specific"
+
+        # Second pass: Fallback matches (ModuleNameContains is empty)（特定のマッチングがない場合）
+        for position in self._fallback_positions:
+            if not (self._exclude_ids[position] & found):
+                return self.rules[position], "Fallback"
+
+        return None, None
+
+# キャラクターごとに設定を分割したインデックス（モジュールは自分のキャラクターの設定のみを参照する）
+class RuleIndex:
+    # 初期化（設定をキャラクターコードごとに振り分け、それぞれのマッチャーを構築する）
+    def __init__(self, rules):
+        rules_by_chara = {} # キャラクターコード -> 設定（ファイル順）
+        for rule in rules:
+            rules_by_chara.setdefault(rule.chara, []).append(rule)
+        self._matchers = {chara: RuleMatcher(chara_rules) for chara, chara_rules in rules_by_chara.items()}
+
+    # キャラクターとモジュール名に最初にマッチする設定を返す (マッチしない場合は (None, None))
+    def match(self, name, chara):
+        matcher = self._matchers.get(chara)
+        if matcher is None:
+            return None, None
+        return matcher.match(name)
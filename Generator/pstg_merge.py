@@ -0,0 +1,113 @@
+import os
+import re
+import mmap
+import logging
+import pstg_backup
+import pstg_util
+from pstg_emitter import TomlEmitter
+
+# Pose TOMLの「ID = PoseID」行（行末の改行は含めない）
+POSE_LINE_PATTERN = re.compile(rb'^[ \t]*(\d+)[ \t]*=[^\r\n]*', re.MULTILINE)
+
+def index_pose_lines(data):
+    """既存のPose TOMLの行をモジュールIDごとに (行の開始位置, 行末, 次の行の開始位置) のリストとして索引する"""
+    index = {} # モジュールID -> 行の位置のリスト
+    for match in POSE_LINE_PATTERN.finditer(data):
+        end = match.end()
+        next_start = end
+        if data[next_start:next_start + 2] == b'\r\n':
+            next_start += 2
+        elif data[next_start:next_start + 1] == b'\n':
+            next_start += 1
+        index.setdefault(int(match.group(1)), []).append((match.start(), end, next_start))
+    return index
+
+# 既存のPose TOMLにマージする（解決結果が変わったIDの行のみ置き換え、新しいIDは末尾に追加し、手動で編集した行は残す）
+class PoseTomlMerger(TomlEmitter):
+    # 初期化（previous_outputsは前回生成したモジュールIDごとの出力、drop_missing=Trueの場合はモジュールテーブルから削除されたIDの行を削除する）
+    def __init__(self, file_path, target, previous_outputs, drop_missing=False, current_ids=()):
+        super().__init__(file_path)
+        self.target = target # 出力先キー
+        self.previous_outputs = previous_outputs # 前回生成したモジュールID -> 出力先キー -> エントリ
+        self.drop_missing = drop_missing # 削除されたモジュールのIDの行を削除するか
+        self.current_ids = set(current_ids) # 今回のモジュールテーブルの全モジュールID
+        self._entries = {} # モジュールID -> 今回のエントリ
+
+    # エントリの追加
+    def push(self, entry, module_id=0):
+        self.count += 1
+        self._entries[module_id] = entry
+
+    # 既存のファイルと今回のエントリから置き換える範囲を決める
+    def _plan(self, data):
+        index = index_pose_lines(data)
+        replacements = [] # (開始位置, 終了位置, 置き換える内容)
+        appended = [] # 末尾に追加するエントリ
+        kept_edits = 0 # 手動編集を残した行数
+        for module_id, entry in self._entries.items():
+            spans = index.pop(module_id, None)
+            content = pstg_util.encode_text_output(entry)
+            if spans is None:
+                appended.append(content)
+                continue
+            previous = self.previous_outputs.get(str(module_id), {}).get(self.target) # 前回生成したエントリ
+            for start, end, _ in spans:
+                if data[start:end] == content:
+                    continue
+                if previous == entry: # 解決結果が前回と同じ行は手動編集として残す
+                    kept_edits += 1
+                    continue
+                replacements.append((start, end, content))
+        dropped = 0 # 削除した行数
+        for module_id, spans in index.items():
+            previous = self.previous_outputs.get(str(module_id), {}).get(self.target) # 前回生成したエントリ
+            if previous is None: # 前回このファイルに生成していないID（手動で追加したIDは残す）
+                continue
+            if module_id in self.current_ids:
+                # モジュールテーブルに残っているが今回はエントリがないID（PoseIDが設定されなくなった）は、手動で編集していない行のみ削除する
+                previous_content = pstg_util.encode_text_output(previous)
+                removed_spans = [span for span in spans if data[span[0]:span[1]] == previous_content]
+            elif self.drop_missing:
+                # モジュールテーブルから削除されたIDの行を削除する
+                removed_spans = spans
+            else:
+                continue
+            for start, _, next_start in removed_spans:
+                replacements.append((start, next_start, b''))
+                dropped += 1
+        replacements.sort(key=lambda item: item[0])
+        return replacements, appended, kept_edits, dropped
+
+    # 変更のない範囲は既存のファイルからそのままコピーし、置き換えた行と追加したエントリを書き込む
+    def _write_merged(self, data, replacements, appended):
+        self._open()
+        position = 0
+        for start, end, content in replacements:
+            self._write_bytes(data[position:start])
+            self._write_bytes(content)
+            position = end
+        self._write_bytes(data[position:])
+        if appended:
+            if len(data) and data[len(data) - 1:] != b'\n':
+                self._write_bytes(self._separator)
+            self._write_bytes(self._separator.join(appended))
+
+    # 完了（内容が同じ場合は置き換えず、成功した場合は内容のハッシュを返す）
+    def finish(self, overwrite=False, max_backups=pstg_backup.DEFAULT_MAX_BACKUPS, max_backup_bytes=pstg_backup.DEFAULT_MAX_BACKUP_BYTES):
+        try:
+            with open(self.file_path, 'rb') as existing_file:
+                if os.fstat(existing_file.fileno()).st_size == 0: # 空ファイルはmmapできない
+                    data = b''
+                    replacements, appended, kept_edits, dropped = self._plan(data)
+                    self._write_merged(data, replacements, appended)
+                else:
+                    with mmap.mmap(existing_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        replacements, appended, kept_edits, dropped = self._plan(data)
+                        self._write_merged(data, replacements, appended)
+        except OSError as e:
+            self._fail(e)
+            return None
+
+        updated = len(replacements) - dropped # 置き換えた行数
+        logging.info(f"Pose TOMLをマージしました: 更新 {updated} 件 / 追加 {len(appended)} 件 / 削除 {dropped} 件 / 手動編集を保持 {kept_edits} 件: {self.file_path}")
+        return self._commit(overwrite, max_backups, max_backup_bytes)
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+from array import array
+from pstg_module_table import ModuleTable
+from pstg_util import get_temp_dir
+
+DUMP_FORMATS = ('json', 'binary') # 出力形式（DebugSettingsのDumpModuleData）
+DUMP_FILE_NAMES = {'json': 'module_data.json', 'binary': 'module_data.bin'} # 形式ごとのファイル名
+BINARY_MAGIC = b'PSTGMTB\x00' # バイナリ形式の識別子
+BINARY_VERSION = 1 # バイナリ形式のバージョン
+BINARY_HEADER = struct.Struct('<8sIII') # 識別子, バージョン, 行数, メタデータ(JSON)のサイズ
+BINARY_ALIGNMENT = 8 # 各列の配置境界
+
+def _align(offset):
+    """配置境界に切り上げる"""
+    return (offset + BINARY_ALIGNMENT - 1) // BINARY_ALIGNMENT * BINARY_ALIGNMENT
+
+def _to_little_endian(values):
+    """数値列をリトルエンディアンのバイト列に変換する"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _pack_strings(values):
+    """文字列（またはバイト列）のリストを終端位置の列と連結したバイト列に変換する"""
+    blob = bytearray()
+    offsets = array('I', [0])
+    for value in values:
+        blob += value if isinstance(value, bytes) else value.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+def _write_binary(module_table, dump_file):
+    """モジュールテーブルを列ごとのバイナリ形式で書き込む"""
+    sections = [] # (セクション名, 型, バイト列)
+    sections.append(('module_nums', 'i', _to_little_endian(module_table.module_nums)))
+    sections.append(('ids', 'i', _to_little_endian(module_table.ids)))
+    sections.append(('cos', 'i', _to_little_endian(module_table.cos)))
+    sections.append(('chara_codes', 'H', _to_little_endian(module_table.chara_codes)))
+    name_offsets, name_blob = _pack_strings(module_table.names)
+    sections.append(('name_offsets', 'I', _to_little_endian(name_offsets)))
+    sections.append(('name_blob', 'B', name_blob))
+
+    attribute_keys = [] # 追加属性の属性名
+    for key, (raw_rows, raw_values) in module_table.raw_attributes():
+        attribute_keys.append(key)
+        value_offsets, value_blob = _pack_strings(raw_values)
+        sections.append((f'attribute_rows:{key}', 'i', _to_little_endian(raw_rows)))
+        sections.append((f'attribute_offsets:{key}', 'I', _to_little_endian(value_offsets)))
+        sections.append((f'attribute_blob:{key}', 'B', value_blob))
+
+    # セクションの位置はデータ領域の先頭からの相対位置で記録する
+    layout = {} # セクション名 -> [位置, サイズ, 型]
+    offset = 0
+    for name, typecode, data in sections:
+        offset = _align(offset)
+        layout[name] = [offset, len(data), typecode]
+        offset += len(data)
+
+    meta = json.dumps({
+        "chara_names": module_table.chara_names,
+        "metadata": module_table.metadata,
+        "attributes": attribute_keys,
+        "sections": layout
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    dump_file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(module_table), len(meta)))
+    dump_file.write(meta)
+    data_start = _align(BINARY_HEADER.size + len(meta))
+    position = BINARY_HEADER.size + len(meta)
+    for name, _, data in sections:
+        target = data_start + layout[name][0]
+        dump_file.write(b'\0' * (target - position))
+        dump_file.write(data)
+        position = target + len(data)
+
+def _read_section(buffer, data_start, section):
+    """セクションを数値列として参照する（リトルエンディアン環境ではコピーせずにmmapを参照する）"""
+    offset, size, typecode = section
+    view = memoryview(buffer)[data_start + offset:data_start + offset + size]
+    if typecode == 'B':
+        return view
+    if sys.byteorder == 'big':
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+    return view.cast(typecode)
+
+def _unpack_strings(offsets, blob, decode):
+    """終端位置の列と連結したバイト列から文字列（またはバイト列）のリストを復元する"""
+    values = []
+    start = 0
+    for end in offsets[1:]:
+        value = bytes(blob[start:end])
+        values.append(value.decode('utf-8') if decode else value)
+        start = end
+    return values
+
+def _read_binary(dump_path):
+    """バイナリ形式のダンプをmmapで読み込む（数値列はファイルを直接参照する）"""
+    with open(dump_path, 'rb') as dump_file:
+        buffer = mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, row_count, meta_size = BINARY_HEADER.unpack_from(buffer, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f"対応していないモジュールデータ形式です: {dump_path}")
+    meta = json.loads(bytes(buffer[BINARY_HEADER.size:BINARY_HEADER.size + meta_size]).decode('utf-8'))
+    data_start = _align(BINARY_HEADER.size + meta_size)
+    sections = meta["sections"]
+
+    def read(name):
+        return _read_section(buffer, data_start, sections[name])
+
+    raw_columns = {}
+    for key in meta["attributes"]:
+        raw_values = _unpack_strings(read(f'attribute_offsets:{key}'), read(f'attribute_blob:{key}'), decode=False)
+        raw_columns[key] = (read(f'attribute_rows:{key}'), raw_values)
+
+    module_table = ModuleTable.from_arrays(
+        module_nums=read('module_nums'),
+        ids=read('ids'),
+        cos=read('cos'),
+        chara_codes=read('chara_codes'),
+        chara_names=meta["chara_names"],
+        names=_unpack_strings(read('name_offsets'), read('name_blob'), decode=True),
+        metadata=meta["metadata"],
+        raw_columns=raw_columns
+    )
+    if len(module_table) != row_count:
+        raise ValueError(f"モジュールデータの行数が一致しません: {dump_path}")
+    return module_table
+
+def dump_module_table(module_table, dump_format, dump_dir=None):
+    """モジュールテーブルをTempにダンプしてパスを返す（後から再生できる形式で保存する）"""
+    dump_path = os.path.join(dump_dir or get_temp_dir(), DUMP_FILE_NAMES[dump_format])
+    if dump_format == 'json':
+        with open(dump_path, 'w', encoding='utf-8') as dump_file:
+            json.dump(module_table.to_columns(), dump_file, ensure_ascii=False, separators=(',', ':'))
+    else:
+        with open(dump_path, 'wb') as dump_file:
+            _write_binary(module_table, dump_file)
+    logging.info(f"モジュールデータを保存しました: {dump_path}")
+    return dump_path
+
+def load_module_dump(dump_path):
+    """ダンプしたモジュールデータを読み込む (形式は内容から判定する)"""
+    with open(dump_path, 'rb') as dump_file:
+        is_binary = dump_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if is_binary:
+        module_table = _read_binary(dump_path)
+    else:
+        with open(dump_path, 'r', encoding='utf-8') as dump_file:
+            module_table = ModuleTable.from_columns(json.load(dump_file))
+    logging.info(f"モジュールデータを読み込みました: {dump_path} ({len(module_table)} modules)")
+    return module_table
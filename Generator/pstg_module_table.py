@@ -0,0 +1,271 @@
+import math
+import logging
+from array import array
+
+MISSING = -0x80000000 # 数値列の欠損値（値がない・数値でない場合）
+CORE_KEYS = ('chara', 'cos', 'id', 'name') # 専用の列を持つ属性（マッチングと出力に使用する）
+INT64_MIN = -0x8000000000000000 # 整数列（array('q')）に格納できる範囲
+INT64_MAX = 0x7FFFFFFFFFFFFFFF
+
+def parse_int(text):
+    """整数値を解析する (解析できない・32bitに収まらない場合はMISSING)"""
+    try:
+        value = int(text)
+    except (TypeError, ValueError):
+        return MISSING
+    return value if MISSING < value <= 0x7FFFFFFF else MISSING
+
+def parse_cos(text):
+    """COS_xxx 形式の値をCOS値（番号 - 1）に変換する (解析できない場合はMISSING)"""
+    value = parse_int(text.replace("COS_", ""))
+    return value - 1 if value != MISSING else MISSING
+
+def _decode(value):
+    """属性値を文字列に変換する（抽出時はバイト列のまま保持している）"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace').strip()
+    return value
+
+def _build_typed_column(length, rows, values):
+    """属性値の型を推定して列を作成する（整数 -> array('q')、小数 -> array('d')、それ以外 -> list）"""
+    texts = [_decode(value) for value in values]
+    try:
+        numbers = [int(text) for text in texts]
+        if all(INT64_MIN <= number <= INT64_MAX for number in numbers):
+            column = array('q', [MISSING]) * length # 欠損値はMISSING
+        else: # 64bitに収まらない整数は文字列のまま保持する
+            numbers = texts
+            column = [None] * length
+    except ValueError:
+        try:
+            numbers = [float(text) for text in texts]
+            column = array('d', [math.nan]) * length # 欠損値はNaN
+        except ValueError:
+            numbers = texts
+            column = [None] * length # 欠損値はNone
+    for row, number in zip(rows, numbers):
+        column[row] = number
+    return column
+
+# モジュールデータを列ごとに保持するテーブル（行番号で各列を参照する）
+class ModuleTable:
+    __slots__ = ('module_nums', 'ids', 'cos', 'chara_codes', 'chara_names', 'names', 'metadata',
+                 '_chara_lookup', '_raw_columns', '_typed_columns', '_rows_by_id', '_source')
+
+    # 初期化
+    def __init__(self):
+        self.module_nums = array('i') # モジュール番号
+        self.ids = array('i') # モジュールID
+        self.cos = array('i') # COS値（COS_番号 - 1）
+        self.chara_codes = array('H') # キャラクターコード（chara_namesの位置）
+        self.chara_names = [] # キャラクターコード -> キャラクター名
+        self.names = [] # モジュール名
+        self.metadata = {} # モジュール番号が数値でない属性（module.data_list.length など）
+        self._chara_lookup = {} # キャラクター名 -> キャラクターコード
+        self._raw_columns = {} # 属性名 -> (行番号, 未変換の値) （参照されるまで型変換しない）
+        self._typed_columns = {} # 属性名 -> 型変換済みの列
+        self._rows_by_id = None # モジュールID -> 行番号（参照時に作成する）
+        self._source = None # take()の元テーブルと行番号（追加属性は参照時に取り出す）
+
+    # 行数
+    def __len__(self):
+        return len(self.names)
+
+    # キャラクター名をコードに変換する（初出の名前は登録する）
+    def intern_chara(self, chara):
+        code = self._chara_lookup.get(chara)
+        if code is None:
+            code = self._chara_lookup[chara] = len(self.chara_names)
+            self.chara_names.append(chara)
+        return code
+
+    # 空の行を追加して行番号を返す
+    def add_row(self, module_num):
+        self.module_nums.append(parse_int(module_num))
+        self.ids.append(MISSING)
+        self.cos.append(MISSING)
+        self.chara_codes.append(self.intern_chara(''))
+        self.names.append('')
+        return len(self.names) - 1
+
+    # 行の値を設定する（BINファイルのキーと値の文字列から変換する）
+    def set_value(self, row, key, text):
+        if key == 'id':
+            self.ids[row] = parse_int(text)
+        elif key == 'cos':
+            self.cos[row] = parse_cos(text)
+        elif key == 'chara':
+            self.chara_codes[row] = self.intern_chara(text)
+        elif key == 'name':
+            self.names[row] = text
+
+    # 追加属性の値を未変換のまま設定する関数を返す（型変換は列の参照時に行う）
+    def raw_value_setter(self, key):
+        raw_column = self._raw_columns.get(key)
+        if raw_column is None:
+            raw_column = self._raw_columns[key] = (array('i'), [])
+        self._typed_columns.pop(key, None)
+        append_row, append_value = raw_column[0].append, raw_column[1].append
+
+        def set_raw_value(row, value):
+            append_row(row)
+            append_value(value)
+        return set_raw_value
+
+    # take()で作成したテーブルの追加属性を元テーブルから取り出す
+    def _materialize_source(self):
+        if self._source is None:
+            return
+        parent, rows = self._source
+        self._source = None
+        new_rows = {row: new_row for new_row, row in enumerate(rows)} # 元の行番号 -> 新しい行番号
+        for key, (raw_rows, raw_values) in parent.raw_attributes():
+            taken = [(new_rows[row], value) for row, value in zip(raw_rows, raw_values) if row in new_rows]
+            if taken:
+                self._raw_columns[key] = (array('i', [row for row, _ in taken]), [value for _, value in taken])
+
+    # 追加属性の (属性名, (行番号, 未変換の値)) を列挙する
+    def raw_attributes(self):
+        self._materialize_source()
+        return self._raw_columns.items()
+
+    # 全属性名（専用の列を持つ属性と追加属性）
+    def attribute_keys(self):
+        return list(CORE_KEYS) + sorted(key for key, _ in self.raw_attributes())
+
+    # 属性の列を返す（追加属性は初回参照時に型を推定して作成する、存在しない場合はNone）
+    def column(self, key):
+        if key == 'id':
+            return self.ids
+        if key == 'cos':
+            return self.cos
+        if key == 'chara':
+            return self.charas()
+        if key == 'name':
+            return self.names
+        column = self._typed_columns.get(key)
+        if column is None:
+            self._materialize_source()
+            raw_column = self._raw_columns.get(key)
+            if raw_column is None:
+                return None
+            column = self._typed_columns[key] = _build_typed_column(len(self), *raw_column)
+        return column
+
+    # 行の属性値 (存在しない場合はNone)
+    def value(self, row, key):
+        column = self.column(key)
+        if column is None:
+            return None
+        value = column[row]
+        if value == MISSING or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return value
+
+    # モジュールIDに対応する行番号 (存在しない場合はNone、IDが重複する場合は最初の行)
+    def row_for_id(self, module_id):
+        if self._rows_by_id is None:
+            rows_by_id = {}
+            for row, row_id in enumerate(self.ids):
+                if row_id != MISSING:
+                    rows_by_id.setdefault(row_id, row)
+            self._rows_by_id = rows_by_id
+        return self._rows_by_id.get(module_id)
+
+    # 行のキャラクター名
+    def chara(self, row):
+        return self.chara_names[self.chara_codes[row]]
+
+    # 全行のキャラクター名
+    def charas(self):
+        chara_names = self.chara_names
+        return [chara_names[code] for code in self.chara_codes]
+
+    # 全行のキャラクター名を変換する（変換はキャラクターごとに一度だけ行う）
+    def map_charas(self, map_chara, mapping_type):
+        mapped = [map_chara(chara, mapping_type) for chara in self.chara_names]
+        return [mapped[code] for code in self.chara_codes]
+
+    # 指定した行のみを持つテーブルを作成する（追加属性は参照時に取り出す）
+    def take(self, rows):
+        rows = list(rows)
+        table = ModuleTable()
+        table.chara_names = list(self.chara_names)
+        table._chara_lookup = dict(self._chara_lookup)
+        for column in ('module_nums', 'ids', 'cos', 'chara_codes'):
+            source = getattr(self, column)
+            getattr(table, column).extend(source[row] for row in rows)
+        table.names = [self.names[row] for row in rows]
+        table.metadata = dict(self.metadata)
+        table._source = (self, rows)
+        return table
+
+    # 行を辞書に変換する（デバッグ出力用）
+    def row_dict(self, row):
+        row_dict = {
+            "module_num": self.module_nums[row],
+            "chara": self.chara(row),
+            "cos": self.cos[row],
+            "id": self.ids[row],
+            "name": self.names[row]
+        }
+        for key, _ in self.raw_attributes():
+            value = self.value(row, key)
+            if value is not None:
+                row_dict[key] = value
+        return row_dict
+
+    # 全行を辞書のリストに変換する（デバッグ出力用）
+    def to_dicts(self):
+        return [self.row_dict(row) for row in range(len(self))]
+
+    # 列ごとのリストに変換する（キャッシュ保存用）
+    def to_columns(self):
+        return {
+            "module_nums": self.module_nums.tolist(),
+            "ids": self.ids.tolist(),
+            "cos": self.cos.tolist(),
+            "chara_codes": self.chara_codes.tolist(),
+            "chara_names": self.chara_names,
+            "names": self.names,
+            "metadata": self.metadata,
+            "attributes": {key: [raw_rows.tolist(), [_decode(value) for value in raw_values]] for key, (raw_rows, raw_values) in self.raw_attributes()}
+        }
+
+    # 各列から作成する（数値列はarrayのほか、memoryviewなど読み取り専用の列も使用できる）
+    @classmethod
+    def from_arrays(cls, module_nums, ids, cos, chara_codes, chara_names, names, metadata, raw_columns):
+        lengths = {len(module_nums), len(ids), len(cos), len(chara_codes), len(names)}
+        if len(lengths) != 1:
+            raise ValueError(f"列の長さが一致しません: {sorted(lengths)}")
+        table = cls()
+        table.module_nums = module_nums
+        table.ids = ids
+        table.cos = cos
+        table.chara_codes = chara_codes
+        table.chara_names = list(chara_names)
+        table._chara_lookup = {chara: code for code, chara in enumerate(table.chara_names)}
+        table.names = list(names)
+        table.metadata = dict(metadata)
+        table._raw_columns = dict(raw_columns)
+        return table
+
+    # 列ごとのリストから作成する（キャッシュ読み込み用）
+    @classmethod
+    def from_columns(cls, columns):
+        return cls.from_arrays(
+            module_nums=array('i', columns["module_nums"]),
+            ids=array('i', columns["ids"]),
+            cos=array('i', columns["cos"]),
+            chara_codes=array('H', columns["chara_codes"]),
+            chara_names=columns["chara_names"],
+            names=columns["names"],
+            metadata=columns["metadata"],
+            raw_columns={key: (array('i', raw_rows), raw_values) for key, (raw_rows, raw_values) in columns["attributes"].items()}
+        )
+
+def log_missing_values(table):
+    """IDやCOSを解析できなかったモジュールをログに出力する"""
+    for row in range(len(table)):
+        if table.ids[row] == MISSING or table.cos[row] == MISSING:
+            logging.warning(f"IDまたはCOSを解析できないモジュールがあります (出力から除外されます): {table.names[row]}")
@@ -0,0 +1,86 @@
+import logging
+from pstg_rule import parse_contains, split_keywords
+from pstg_matcher import KeywordAutomaton
+
+# TomlProfileの設定（キーワードは読み込み時に一度だけ分割する）
+class TomlProfile:
+    __slots__ = ('section', 'includes', 'excludes', 'config_file', 'pose_file_name')
+
+    # 初期化
+    def __init__(self, section, includes, excludes, config_file, pose_file_name):
+        self.section = section # セクション名
+        self.includes = includes # ModuleMatch（いずれかを含むモジュールがあればマッチ）
+        self.excludes = excludes # ModuleExclude（含むモジュールはマッチ判定から除外）
+        self.config_file = config_file # 使用するPoseScale設定ファイル名（拡張子なし）
+        self.pose_file_name = pose_file_name # 出力するPose TOMLファイル名（拡張子なし）
+
+# プロファイルごとの選択結果（マッチしたモジュールの一覧）
+class ProfileSelection:
+    __slots__ = ('profile', 'modules', 'rows')
+
+    # 初期化
+    def __init__(self, profile, modules, rows):
+        self.profile = profile # TomlProfile
+        self.modules = modules # このプロファイルにマッチしたモジュールのテーブル
+        self.rows = rows # modulesの各行に対応する元のテーブルの行番号
+
+def load_profiles(config_profile):
+    """TomlProfile_セクションを読み込む"""
+    profiles = []
+    for section in config_profile.sections():
+        # TomlProfile_で始まるセクション
+        if not section.startswith('TomlProfile_'):
+            continue
+        includes, legacy_excludes = parse_contains(config_profile.get(section, 'ModuleMatch', fallback=''))
+        explicit_excludes = split_keywords(config_profile.get(section, 'ModuleExclude', fallback=''))
+        profile = TomlProfile(
+            section=section,
+            includes=includes,
+            excludes=legacy_excludes + explicit_excludes,
+            config_file=config_profile.get(section, 'ConfigFile', fallback='').strip(),
+            pose_file_name=config_profile.get(section, 'PoseFileName', fallback='').strip()
+        )
+        logging.debug(f"Checking Profile: {section}, Keywords: {profile.includes}, Exclude: {profile.excludes}")
+        profiles.append(profile)
+    return profiles
+
+def select_profiles(module_table, app_config):
+    """モジュールデータにマッチするプロファイルと、そのプロファイルにマッチしたモジュールを求める"""
+    if not app_config['UseModuleNameContains']: # プロファイルが無効な場合
+        return []
+
+    profiles = app_config.get('CompiledProfiles') # 設定キャッシュの解析済みプロファイル
+    if profiles is None:
+        config_profile = app_config.get('ProfileConfig', app_config['ConfigParser']) # 設定ファイル
+        profiles = load_profiles(config_profile)
+    if not profiles:
+        return []
+
+    # 全プロファイルのキーワードから1つのオートマトンを構築し、モジュール名は一度だけ走査する
+    keyword_ids = {} # キーワード -> キーワード番号
+    def to_ids(keywords):
+        return frozenset(keyword_ids.setdefault(keyword, len(keyword_ids)) for keyword in keywords)
+    profile_keywords = [(to_ids(profile.includes), to_ids(profile.excludes)) for profile in profiles]
+    automaton = KeywordAutomaton(keyword_ids.keys())
+
+    matched_rows = [[] for _ in profiles] # プロファイルごとのマッチしたモジュールの行番号
+    for row, module_name in enumerate(module_table.names): # モジュールデータを走査
+        found = automaton.find(module_name)
+        if not found:
+            continue
+        for index, (include_ids, exclude_ids) in enumerate(profile_keywords):
+            # 除外キーワードを含まず、いずれかのキーワードを含む (OR) 場合にマッチ
+            if include_ids & found and not exclude_ids & found:
+                matched_rows[index].append(row)
+
+    selections = [] # マッチしたプロファイル
+    for profile, rows in zip(profiles, matched_rows):
+        if rows:
+            logging.info(f"Profile matched: {profile.section} ({len(rows)} modules)")
+            selections.append(ProfileSelection(profile, module_table.take(rows), rows))
+        else:
+            # マッチしなかった場合、最初の数件のモジュール名をログに出して確認
+            sample_names = module_table.names[:3]
+            logging.debug(f"  No match in profile {profile.section}. Sample module names: {sample_names}")
+            logging.info(f"Profile skipped (no match in module data): {profile.section}")
+    return selections
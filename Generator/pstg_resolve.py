@@ -0,0 +1,32 @@
+import logging
+from pstg_matcher import RuleIndex
+
+# モジュールごとのマッチング結果（Pose/Scaleのどちらの設定が適用されるか）
+class Resolution:
+    __slots__ = ('row', 'pose_rule', 'scale_rule', 'match_type')
+
+    # 初期化
+    def __init__(self, row, pose_rule, scale_rule, match_type):
+        self.row = row # モジュールテーブルの行番号
+        self.pose_rule = pose_rule # PoseIDを決定した設定（マッチしない場合はNone）
+        self.scale_rule = scale_rule # Scaleを決定した設定（マッチしない場合はNone）
+        self.match_type = match_type # Specific / Fallback
+
+def resolve_modules(module_table, pose_settings, map_chara):
+    """全モジュールを一度ずつマッチングし、Pose/Scaleの適用設定を返す"""
+    logging.info("PoseScale設定のマッチングを開始")
+    rule_index = RuleIndex(pose_settings) # キャラクターごとに分割した設定のインデックス
+    resolutions = [] # マッチング結果
+    module_charas = module_table.map_charas(map_chara, "module_to_setting") # モジュールキャラクター
+
+    # モジュールデータを走査
+    for row, (module_name, module_chara) in enumerate(zip(module_table.names, module_charas)):
+        # Specific設定を優先し、なければFallback設定（ModuleNameContainsが空）でマッチング
+        # 最初にマッチした設定がPose/Scaleの両方を決定する（PoseIDやScaleが空でも後続の設定は参照しない）
+        rule, match_type = rule_index.match(module_name, module_chara)
+        if rule is None:
+             logging.debug(f"マッチするPoseScale設定が見つかりませんでした: {module_name}")
+
+        resolutions.append(Resolution(row, rule, rule, match_type))
+
+    return resolutions
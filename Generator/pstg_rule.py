@@ -0,0 +1,101 @@
+import logging
+from pstg_util import SETTING_CHARA_MAPPING
+
+def split_keywords(keyword_str):
+    """カンマ区切りのキーワード文字列を正規化したタプルに変換する"""
+    if not keyword_str:
+        return ()
+    return tuple(word.strip() for word in keyword_str.split(',') if word.strip())
+
+def parse_contains(contains_str):
+    """ModuleNameContainsを (含むキーワード, 除外キーワード) に分解する"""
+    words = split_keywords(contains_str)
+    includes = tuple(word for word in words if not word.startswith('|')) # includes（含むキーワード）
+    # Legacy support: excludes starting with | in contains_str（contains_str内の|で始まる除外キーワードのサポート）
+    legacy_excludes = tuple(word[1:] for word in words if word.startswith('|')) # legacy_excludes（除外キーワード）
+
+    # 文字化け対策
+    if '\ufffd' in includes:
+        logging.warning(f"設定 {contains_str} に無効な文字が含まれているため、そのキーワードは無視します。")
+        includes = tuple(word for word in includes if word != '\ufffd')
+    return includes, legacy_excludes
+
+# 解析済みのPoseScale設定（キーワード分割・型変換を読み込み時に一度だけ行う）
+class PoseScaleRule:
+    __slots__ = ('source', 'section', 'chara', 'includes', 'excludes', 'is_fallback', 'pose_id', 'scale', 'scale_text')
+
+    # 初期化
+    def __init__(self, source, section, chara, includes, excludes, is_fallback, pose_id, scale, scale_text):
+        self.source = source # 設定ファイル名
+        self.section = section # セクション名
+        self.chara = chara # キャラクターコード（MIK, RIN, ...）
+        self.includes = includes # 含むキーワード（いずれかを含めばマッチ）
+        self.excludes = excludes # 除外キーワード（いずれかを含めば除外）
+        self.is_fallback = is_fallback # ModuleNameContainsが空（キャラ枠指定のみ）か
+        self.pose_id = pose_id # ポーズID（未設定の場合はNone）
+        self.scale = scale # スケール（未設定の場合はNone）
+        self.scale_text = scale_text # TOMLに出力するスケールの文字列
+
+    def __repr__(self):
+        return f"PoseScaleRule({self.source}:{self.section}, Chara={self.chara}, Includes={self.includes}, Excludes={self.excludes}, PoseID={self.pose_id}, Scale={self.scale_text})"
+
+    # モジュール名がこの設定にマッチするか判定
+    def matches(self, name):
+        # Exclude check (if ANY exclude word is found, return False)（除外キーワードが含まれる場合はマッチしない）
+        if any(exc in name for exc in self.excludes):
+            return False
+        if self.is_fallback: # キャラ枠指定のみの場合は除外されなければマッチ
+            return True
+        # ORマッチで処理
+        return any(inc in name for inc in self.includes)
+
+def resolve_chara(chara):
+    """設定のキャラクター指定をキャラクターコードに変換する (MIKUのようなモジュール側の名前も受け付ける)"""
+    if chara is None:
+        return None
+    chara = chara.strip()
+    return SETTING_CHARA_MAPPING.get(chara.upper(), chara)
+
+def _parse_pose_id(value, source, section):
+    """PoseIDを整数に変換する (未設定・不正な値の場合はNone)"""
+    if value is None or not str(value).strip():
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        logging.warning(f"PoseIDが整数ではないため無視します: {source} [{section}] PoseID={value}")
+        return None
+
+def _parse_scale(value, source, section):
+    """Scaleを数値に変換する (未設定・不正な値の場合は (None, None))"""
+    if value is None or not str(value).strip():
+        return None, None
+    scale_text = str(value).strip()
+    try:
+        return float(scale_text), scale_text
+    except ValueError:
+        logging.warning(f"Scaleが数値ではないため無視します: {source} [{section}] Scale={value}")
+        return None, None
+
+def compile_rule(source, section, setting):
+    """設定ファイルのセクションからPoseScaleRuleを生成する"""
+    contains_str = setting.get("ModuleNameContains")
+    is_fallback = not contains_str # Fallback（ModuleNameContainsが空）
+    includes, legacy_excludes = parse_contains(contains_str)
+    explicit_excludes = split_keywords(setting.get("ModuleExclude")) # explicit_excludes（明示的除外キーワード）
+
+    # キャラ枠指定のみの設定ではModuleExcludeのみを除外キーワードとして使用する
+    excludes = explicit_excludes if is_fallback else legacy_excludes + explicit_excludes
+    scale, scale_text = _parse_scale(setting.get("Scale"), source, section)
+
+    return PoseScaleRule(
+        source=source,
+        section=section,
+        chara=resolve_chara(setting.get("Chara")),
+        includes=includes,
+        excludes=excludes,
+        is_fallback=is_fallback,
+        pose_id=_parse_pose_id(setting.get("PoseID"), source, section),
+        scale=scale,
+        scale_text=scale_text
+    )
@@ -1,64 +1,56 @@
 import logging
-from pstg_util import is_match
+from pstg_module_table import MISSING
 
-def generate_scale_toml(module_data, scale_settings, map_chara):
-    """Scale TOMLデータを生成する"""
-    scale_toml_entries = []
-    logging.info("ScaleTomlデータの変換を開始")
+def iter_scale_entries(module_table, resolutions, map_chara):
+    """マッチング結果からScale TOMLデータを (行番号, エントリ, Scaleを決定した設定) で順次返す"""
+    chara_values = module_table.map_charas(map_chara, "module_to_cos_scale") # キャラクター値
+    cos_values = module_table.cos # COS値
 
-    # モジュールデータを走査
-    for module_value in module_data:
-        module_chara = map_chara(module_value["chara"], "module_to_setting") # モジュールキャラクター
-        
-        # First pass: Specific matches (ModuleNameContains is set)（特定の一致）
-        matched = False
-        # Pose設定を走査
-        for setting in scale_settings:
-            match_str = setting["ModuleNameContains"] # マッチング文字列
-            if match_str: # Specific（特定の一致）
-                if module_chara == setting["Chara"]: # キャラクターが一致
-                    if is_match(module_value["name"], match_str, setting.get("ModuleExclude")): # マッチング
-                        # Apply setting（設定を適用する）
-                        if setting["Scale"] is not None and str(setting["Scale"]).strip(): # Scaleが設定されているかつ空でない
-                            chara_value = map_chara(module_value["chara"], "module_to_cos_scale") # キャラクター値
-                            cos_value = int(module_value["cos"].replace("COS_", "")) - 1 # COS値
-                            scale_value = setting["Scale"] # Scale値
+    # マッチング結果を走査
+    for resolution in resolutions:
+        rule = resolution.scale_rule # Scaleを決定した設定
+        if rule is not None and rule.scale is not None: # Scaleが設定されている
+            row = resolution.row # モジュールテーブルの行番号
+            if cos_values[row] == MISSING:
+                continue
+            logging.debug(f"Scaleを設定 ({resolution.match_type}): Module={module_table.names[row]}, Scale={rule.scale_text}")
+            yield row, format_scale_entry(chara_values[row], cos_values[row], rule), rule # Scale TOMLデータ
 
-                            # TOMLエントリを生成
-                            entry = f'[[cos_scale]]\nchara = {chara_value}\ncos = {cos_value}\nscale = {scale_value}\n'
-                            scale_toml_entries.append(entry) # Scale TOMLデータ
-                            logging.debug(f"Scaleを設定 (Specific): Module={module_value['name']}, Scale={scale_value}")
-                        matched = True
-                        break
-        
-        # Second pass: Fallback matches (ModuleNameContains is empty)（一致しない場合）
-        if not matched:
-            for setting in scale_settings: # Scale設定を走査
-                match_str = setting["ModuleNameContains"] # マッチング文字列
-                if not match_str: # Fallback
-                    if module_chara == setting["Chara"]: # キャラクターが一致
-                        # Check excludes manually since is_match returns False for empty match_str（一致しない場合）
-                        exclude_str = setting.get("ModuleExclude") # 除外文字列
-                        is_excluded = False # 除外フラグ
-                        if exclude_str: # 除外文字列が設定されている
-                             excludes = [word.strip() for word in exclude_str.split(',') if word.strip()] # 除外文字列をリストに変換
-                             if any(exc in module_value["name"] for exc in excludes): # 除外文字列が一致
-                                 is_excluded = True # 除外フラグ
-                        
-                        if not is_excluded: # 除外文字列が一致しない場合
-                            # Apply setting（設定を適用する）
-                            if setting["Scale"] is not None and str(setting["Scale"]).strip(): # Scaleが設定されているかつ空でない
-                                chara_value = map_chara(module_value["chara"], "module_to_cos_scale") # キャラクター値
-                                cos_value = int(module_value["cos"].replace("COS_", "")) - 1 # COS値
-                                scale_value = setting["Scale"] # Scale値
+def format_scale_entry(chara_value, cos_value, rule):
+    """[[cos_scale]] エントリを生成する"""
+    return f'[[cos_scale]]\nchara = {chara_value}\ncos = {cos_value}\nscale = {rule.scale_text}\n'
 
-                                entry = f'[[cos_scale]]\nchara = {chara_value}\ncos = {cos_value}\nscale = {scale_value}\n'
-                                scale_toml_entries.append(entry)
-                                logging.debug(f"Scaleを設定 (Fallback): Module={module_value['name']}, Scale={scale_value}")
-                            matched = True
-                            break
-                            
-        if not matched:
-             logging.debug(f"マッチする設定が見つかりませんでした: {module_value['name']}")
+def describe_rule(rule):
+    """競合の報告に使う設定の表記（設定ファイル名とセクション名）"""
+    return f'{rule.source} [{rule.section}]'
 
-    return scale_toml_entries
+# (キャラクター, COS値) ごとにScaleエントリを索引し、同じスケールの重複は1つにまとめ、異なるスケールは競合として報告する（異なるスケールのエントリはすべて出力する）
+class ScaleEntryIndex:
+    # 初期化
+    def __init__(self):
+        self._scales = {} # (キャラクター, COS値) -> スケール -> (設定, モジュール名) （最初にマッチしたもの）
+        self._emitted = set() # 出力済みの ((キャラクター, COS値), スケール)
+        self.duplicates = 0 # まとめた同じ内容のエントリ数
+
+    # エントリの登録（sourceは (スケール, 設定)）
+    def add(self, key, source, module_name):
+        scale_text, rule_label = source
+        self._scales.setdefault(key, {}).setdefault(scale_text, (rule_label, module_name))
+
+    # エントリを出力するか（同じキャラクター・COS値・スケールのエントリは最初の1つのみ出力する）
+    def should_emit(self, key, source):
+        emitted_key = (key, source[0])
+        if emitted_key in self._emitted:
+            self.duplicates += 1
+            return False
+        self._emitted.add(emitted_key)
+        return True
+
+    # 重複と競合の報告
+    def log_summary(self):
+        if self.duplicates:
+            logging.info(f"同じキャラクター・COS値の重複したScaleエントリをまとめました: {self.duplicates} 件")
+        for (chara_value, cos_value), scales in self._scales.items():
+            if len(scales) > 1:
+                details = " / ".join(f"scale = {scale_text} ({rule_label}, Module={module_name})" for scale_text, (rule_label, module_name) in scales.items())
+                logging.warning(f"Scaleが競合しています (chara = {chara_value}, cos = {cos_value}、すべてのエントリを出力します): {details}")
@@ -0,0 +1,46 @@
+import os
+import logging
+import pstg_batch
+import pstg_generate
+import pstg_manifest
+
+MODULE_TABLE_NAMES = ('gm_module_tbl.farc', 'mod_gm_module_tbl.farc') # 検索対象のFARCファイル名
+
+def find_module_tables(root_dir):
+    """ルートディレクトリ以下のgm_module_tbl.farcを再帰的に検索する"""
+    farc_paths = [] # 見つかったFARCファイル
+    pending_dirs = [root_dir] # 未走査のディレクトリ
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending_dirs.append(entry.path)
+                    elif entry.is_file() and entry.name.lower() in MODULE_TABLE_NAMES:
+                        farc_paths.append(os.path.abspath(entry.path))
+        except OSError as e:
+            logging.warning(f"ディレクトリの走査に失敗しました (無視します): {current_dir}: {e}")
+
+    farc_paths.sort()
+    logging.info(f"gm_module_tblを{len(farc_paths)}件見つけました: {root_dir}")
+    return farc_paths
+
+def run_scan(root_dir, app_config, workers=None, delete_temp=True, force=False):
+    """ルートディレクトリ以下の全gm_module_tblを並列に処理し、全体の終了コードを返す"""
+    farc_paths = find_module_tables(root_dir)
+
+    # 前回の生成時から入力が変わっていないFARCはスキップする（マニフェストは生成処理で記録される）
+    if force:
+        stale_paths = farc_paths
+        app_config = dict(app_config, ForceRebuild=True) # ワーカーでも前回の生成結果を使用しない
+    else:
+        stale_paths = [farc_path for farc_path in farc_paths
+                       if not pstg_manifest.is_up_to_date(app_config, farc_path, pstg_generate.resolve_save_directory(farc_path, app_config))]
+    skipped = len(farc_paths) - len(stale_paths)
+    if skipped:
+        logging.info(f"入力が変更されていないため{skipped}件をスキップします")
+        print(f"入力が変更されていないため{skipped}件をスキップします")
+
+    results = pstg_batch.run_batch(stale_paths, app_config, workers=workers, delete_temp=delete_temp) if stale_paths else []
+    return pstg_batch.report_results(results)
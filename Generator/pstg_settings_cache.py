@@ -0,0 +1,157 @@
+import os
+import json
+import logging
+import configparser
+import pstg_config
+import pstg_loader
+import pstg_manifest
+import pstg_profile
+from pstg_profile import TomlProfile
+from pstg_rule import PoseScaleRule
+from pstg_util import get_app_dir
+
+SETTINGS_CACHE_FILE = 'CompiledSettings.json' # 解析済み設定のキャッシュファイル名
+SETTINGS_CACHE_VERSION = 2 # キャッシュ形式のバージョン（設定の解析処理を変更した場合は更新する）
+CONFIG_PARSER_KEYS = ('ConfigParser', 'ProfileConfig') # app_configのうちConfigParserを保持する項目
+
+def get_settings_cache_path():
+    """解析済み設定のキャッシュファイルのパスを取得"""
+    return os.path.join(get_app_dir(), 'Settings', SETTINGS_CACHE_FILE)
+
+def collect_source_signature():
+    """キャッシュの元になる設定ファイル群の更新日時とサイズ、Generatorのコードの状態を取得する"""
+    app_dir = get_app_dir()
+    settings_dir = os.path.join(app_dir, 'Settings')
+    # Config.iniはSettings、なければrootから読み込まれるため両方を対象にする
+    source_files = [
+        os.path.join(settings_dir, 'Config.ini'),
+        os.path.join(app_dir, 'Config.ini'),
+        os.path.join(settings_dir, 'TomlProfile.ini')
+    ]
+    pose_data_dir = pstg_loader.get_pose_data_dir({'SettingsDir': settings_dir})
+    if os.path.isdir(pose_data_dir):
+        source_files.extend(os.path.join(pose_data_dir, name) for name in sorted(os.listdir(pose_data_dir)) if name.endswith('.ini'))
+
+    signature = {} # パス -> (更新日時, サイズ)（存在しない場合はNone）
+    for path in source_files:
+        try:
+            stat = os.stat(path)
+            signature[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature[path] = None
+    # 設定の解析処理や設定項目が変わった場合（Generatorの更新）も再作成する
+    signature['generator'] = pstg_manifest.compute_generator_signature()
+    return signature
+
+# キャッシュはSettingsフォルダごと共有されることがあるため、コードを実行できる形式（pickle）は使わず
+# 値のみをJSONで保存し、読み込み時にオブジェクトを作り直す
+
+def _config_to_data(config):
+    """ConfigParserをセクション -> キー -> 値（補間前）の辞書に変換する"""
+    data = {configparser.DEFAULTSECT: dict(config.defaults())}
+    for section in config.sections():
+        data[section] = {key: config.get(section, key, raw=True) for key in config.options(section)}
+    return data
+
+def _config_from_data(data):
+    """辞書からConfigParserを作成する"""
+    config = configparser.ConfigParser()
+    config.read_dict(data)
+    return config
+
+def _slots_to_data(obj):
+    """__slots__を持つオブジェクトを値のリストに変換する"""
+    return [getattr(obj, name) for name in obj.__slots__]
+
+def _slots_from_data(cls, values):
+    """値のリストから__slots__を持つオブジェクトを作成する（リストはタプルに戻す）"""
+    if len(values) != len(cls.__slots__):
+        raise ValueError(f"{cls.__name__}の項目数が一致しません")
+    return cls(**{name: tuple(value) if isinstance(value, list) else value for name, value in zip(cls.__slots__, values)})
+
+def _encode_app_config(app_config):
+    """アプリケーション設定をJSONに保存できる値に変換する"""
+    data = {key: value for key, value in app_config.items() if key not in CONFIG_PARSER_KEYS and key != 'CompiledProfiles'}
+    data['ConfigParser'] = _config_to_data(app_config['ConfigParser'])
+    # プロファイル設定がない場合はメイン設定を共有している
+    profile_config = app_config.get('ProfileConfig', app_config['ConfigParser'])
+    data['ProfileConfig'] = None if profile_config is app_config['ConfigParser'] else _config_to_data(profile_config)
+    data['CompiledProfiles'] = [_slots_to_data(profile) for profile in app_config['CompiledProfiles']]
+    return data
+
+def _decode_app_config(data):
+    """保存した値からアプリケーション設定を作成する"""
+    app_config = dict(data)
+    app_config['ConfigParser'] = _config_from_data(data['ConfigParser'])
+    app_config['ProfileConfig'] = app_config['ConfigParser'] if data['ProfileConfig'] is None else _config_from_data(data['ProfileConfig'])
+    app_config['CompiledProfiles'] = [_slots_from_data(TomlProfile, values) for values in data['CompiledProfiles']]
+    return app_config
+
+def _encode_setting_files(setting_file_cache):
+    """読み込み済みPoseScale設定ファイルをJSONに保存できる値に変換する"""
+    return {path: [mtime_ns, size, [_slots_to_data(rule) for rule in rules]] for path, (mtime_ns, size, rules) in setting_file_cache.items()}
+
+def _decode_setting_files(data):
+    """保存した値から読み込み済みPoseScale設定ファイルを作成する"""
+    return {path: (mtime_ns, size, [_slots_from_data(PoseScaleRule, values) for values in rules]) for path, (mtime_ns, size, rules) in data.items()}
+
+def load_compiled_settings():
+    """設定ファイルが更新されていなければキャッシュから解析済み設定を読み込む (無効な場合はNone)"""
+    cache_path = get_settings_cache_path()
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            compiled = json.load(cache_file)
+        if compiled.get('version') != SETTINGS_CACHE_VERSION:
+            return None
+        # JSONではタプルがリストになるため、比較のためにリストに揃える
+        if compiled.get('signature') != json.loads(json.dumps(collect_source_signature())):
+            logging.info("設定ファイルが更新されたため設定キャッシュを再作成します")
+            return None
+        return {
+            "app_config": _decode_app_config(compiled['app_config']),
+            "setting_files": _decode_setting_files(compiled['setting_files'])
+        }
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, configparser.Error) as e:
+        logging.warning(f"設定キャッシュの読み込みに失敗しました (無視します): {e}")
+        return None
+
+def save_compiled_settings(app_config, setting_file_cache, signature):
+    """解析済み設定をキャッシュファイルに保存する"""
+    cache_path = get_settings_cache_path()
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        compiled = {
+            "version": SETTINGS_CACHE_VERSION, # キャッシュ形式のバージョン
+            "signature": signature, # 元の設定ファイル群の状態
+            "app_config": _encode_app_config(app_config), # アプリケーション設定（解析済みのプロファイルを含む）
+            "setting_files": _encode_setting_files(setting_file_cache) # 解析済みのPoseScale設定ファイル
+        }
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(compiled, cache_file, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+        logging.info(f"設定キャッシュを保存しました: {cache_path}")
+    except (OSError, TypeError, ValueError) as e:
+        logging.warning(f"設定キャッシュの保存に失敗しました (無視します): {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def load_settings():
+    """アプリケーション設定とPoseScale設定を読み込む (設定ファイルが更新されていなければキャッシュを使用)"""
+    compiled = load_compiled_settings()
+    if compiled is not None:
+        pstg_loader.seed_setting_file_cache(compiled['setting_files'])
+        logging.info("設定キャッシュを使用します")
+        return compiled['app_config']
+
+    # 解析前の状態を記録しておく（解析中に更新された場合は次回再作成される）
+    signature = collect_source_signature()
+    app_config = pstg_config.load_app_config()
+    config_profile = app_config.get('ProfileConfig', app_config['ConfigParser'])
+    app_config['CompiledProfiles'] = pstg_profile.load_profiles(config_profile) # 解析済みのプロファイル
+    setting_file_cache = pstg_loader.preload_setting_files(app_config)
+    save_compiled_settings(app_config, setting_file_cache, signature)
+    return app_config
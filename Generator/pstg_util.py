@@ -1,9 +1,12 @@
 import os
 import shutil
+import hashlib
 import logging
 import sys
+import tempfile
+import pstg_backup
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
+
 
 def get_app_dir():
     """実行ファイルのディレクトリパスを取得"""
@@ -12,10 +15,28 @@ def get_app_dir():
     else:
         return os.path.dirname(os.path.abspath(__file__)) # 実行ファイルのディレクトリ
 
-def get_temp_dir():
-    """Tempディレクトリのパスを取得"""
+_work_dir = None # 実行ごとの作業ディレクトリ（並列実行時に他の実行と衝突しないよう分離する）
+TEMP_CREATE_RETRIES = 5 # 作業ディレクトリの作成を再試行する回数
+
+def get_temp_root_dir():
+    """Tempディレクトリ（各実行の作業ディレクトリの親）のパスを取得"""
     return os.path.join(get_app_dir(), 'Temp') # Tempディレクトリ
 
+def get_temp_dir():
+    """この実行専用の作業ディレクトリのパスを取得 (初回呼び出し時に作成)"""
+    global _work_dir
+    if _work_dir is None:
+        temp_root_dir = get_temp_root_dir()
+        for attempt in range(TEMP_CREATE_RETRIES):
+            os.makedirs(temp_root_dir, exist_ok=True)
+            try:
+                _work_dir = tempfile.mkdtemp(prefix=f'run_{os.getpid()}_', dir=temp_root_dir) # 実行ごとに固有のディレクトリ
+                break
+            except FileNotFoundError: # 作成直後に他の実行が空のTempディレクトリを削除した場合は作り直す
+                if attempt == TEMP_CREATE_RETRIES - 1:
+                    raise
+    return _work_dir
+
 def setup_logging(output_log=False):
     """ロガーの初期化"""
     logger = logging.getLogger() # ロガー
@@ -61,92 +82,98 @@ def setup_logging(output_log=False):
         debug_handler.addFilter(lambda record: record.levelno == logging.DEBUG) # デバッグフィルター
         logger.addHandler(debug_handler) # デバッグハンドラーを追加
 
+def reset_temp_dir():
+    """この実行の作業ディレクトリを削除せずに残し、次の処理では新しい作業ディレクトリを使用する"""
+    global _work_dir
+    if _work_dir is not None:
+        logging.info(f"デバッグ設定によりTempディレクトリを残しました: {_work_dir}")
+    _work_dir = None
+
 def clean_temp_dir():
-    """Tempディレクトリを削除"""
-    temp_dir = get_temp_dir() # Tempディレクトリ
-    if os.path.exists(temp_dir): # Tempディレクトリが存在する場合
+    """この実行の作業ディレクトリを削除 (他の実行の作業ディレクトリには触れない)"""
+    global _work_dir
+    if _work_dir is None: # 作業ディレクトリが作成されていない場合
+        return
+
+    temp_dir, _work_dir = _work_dir, None # 作業ディレクトリ
+    if os.path.exists(temp_dir): # 作業ディレクトリが存在する場合
         try:
             shutil.rmtree(temp_dir, ignore_errors=True)
             logging.info(f"Tempディレクトリを削除しました: {temp_dir}")
         except Exception as e:
             logging.warning(f"Tempディレクトリの削除に失敗しました (無視します): {e}")
 
-def save_file_with_timestamp(file_path, data, overwrite=False):
-    """タイムスタンプ付きでファイルを保存 (overwrite=Trueの場合は上書き)"""
-    if os.path.exists(file_path) and not overwrite: # 既存のファイルが存在する場合
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S") # タイムスタンプ
-        base, ext = os.path.splitext(file_path) # ファイル名と拡張子
-        rename_path = f"{base}_{timestamp}{ext}" # リネーム後のファイル名
-        try:
-            os.rename(file_path, rename_path)
-            logging.info(f"既存のファイルをリネームしました: {rename_path}")
-            print(f"既存のファイルをリネームしました: {rename_path}")
-        except OSError as e:
-            logging.error(f"ファイルのリネームに失敗しました: {e}")
-    elif os.path.exists(file_path) and overwrite: # 既存のファイルが存在する場合
+    # 他の実行が使用していなければ親のTempディレクトリも削除する
+    try:
+        os.rmdir(get_temp_root_dir())
+    except OSError:
+        pass
+
+def encode_text_output(data):
+    """テキストをファイルに保存される内容（UTF-8、OSの改行コード）のバイト列に変換する"""
+    return data.replace('\n', os.linesep).encode('utf-8')
+
+def _read_existing_hash(file_path):
+    """既存ファイルの内容のハッシュ (存在しない・読み込めない場合はNone、ファイル全体をメモリに読み込まない)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, 'rb') as existing_file:
+            for chunk in iter(lambda: existing_file.read(1024 * 1024), b''):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.digest()
+
+def is_content_unchanged(file_path, content_digest):
+    """既存ファイルの内容が保存する内容（ハッシュ）と同じか判定する"""
+    existing_hash = _read_existing_hash(file_path) # 既存ファイルの内容のハッシュ
+    if existing_hash is not None and existing_hash == content_digest:
+        logging.info(f"内容に変更がないため保存をスキップしました: {file_path}")
+        return True
+    return False
+
+def backup_existing_file(file_path, overwrite=False, max_backups=pstg_backup.DEFAULT_MAX_BACKUPS, max_backup_bytes=pstg_backup.DEFAULT_MAX_BACKUP_BYTES):
+    """置き換える前に既存ファイルをバックアップし、保存を続けてよい場合はTrueを返す (overwrite=Trueの場合はバックアップしない)"""
+    if not os.path.exists(file_path):
+        return True
+    if overwrite: # 既存のファイルが存在する場合
         logging.info(f"既存のファイルを上書きします: {file_path}")
         print(f"既存のファイルを上書きします: {file_path}")
+        return True
+    try:
+        # 出力フォルダの.pstg_backupsに圧縮して保存する（同じ内容は1つだけ保存し、上限を超えた古いものは削除）
+        backup_path = pstg_backup.backup_file(file_path, max_backups=max_backups, max_bytes=max_backup_bytes)
+        logging.info(f"既存のファイルをバックアップしました: {backup_path}")
+        print(f"既存のファイルをバックアップしました: {backup_path}")
+        return True
+    except OSError as e:
+        # バックアップできなかった既存のファイルは失われないよう上書きしない
+        logging.error(f"ファイルのバックアップに失敗したため保存を中止しました: {e}")
+        return False
+
+# モジュールのキャラクター名 -> 設定のキャラクターコード
+SETTING_CHARA_MAPPING = {
+    "MIKU": "MIK", "RIN": "RIN", "LEN": "LEN", "LUKA": "LUK",
+    "NERU": "NER", "HAKU": "HAK", "KAITO": "KAI", "MEIKO": "MEI",
+    "SAKINE": "SAK", "TETO": "TET"
+}
 
-    try: # ファイルを保存
-        with open(file_path, 'w', encoding='utf-8') as save_file:
-            save_file.write(data)
-        print(f'ファイルを保存しました {file_path}')
-        logging.info(f'ファイルを保存しました {file_path}')
-    except OSError as e: # ファイルの保存に失敗しました
-        logging.error(f"ファイルの保存に失敗しました: {e}")
+# モジュールのキャラクター名 -> scale_db.tomlのキャラクター番号
+TOML_CHARA_MAPPING = {
+    "MIKU": "0", "RIN": "1", "LEN": "2", "LUKA": "3",
+    "NERU": "4", "HAKU": "5", "KAITO": "6", "MEIKO": "7",
+    "SAKINE": "8", "TETO": "9"
+}
 
 def load_chara_mapping():
     """キャラクター名のマッピング関数を返す"""
-    setting_chara_mapping = {
-        "MIKU": "MIK", "RIN": "RIN", "LEN": "LEN", "LUKA": "LUK",
-        "NERU": "NER", "HAKU": "HAK", "KAITO": "KAI", "MEIKO": "MEI",
-        "SAKINE": "SAK", "TETO": "TET"
-    }
-
-    toml_chara_mapping = {
-        "MIKU": "0", "RIN": "1", "LEN": "2", "LUKA": "3",
-        "NERU": "4", "HAKU": "5", "KAITO": "6", "MEIKO": "7",
-        "SAKINE": "8", "TETO": "9"
-    }
-
     # キャラクター名のマッピング関数
     def map_chara(chara, mapping_type="module_to_setting"):
         if mapping_type == "module_to_setting": # module_to_setting（モジュール名を設定名に変換）
-            return setting_chara_mapping.get(chara, chara)
+            return SETTING_CHARA_MAPPING.get(chara, chara)
         elif mapping_type == "module_to_cos_scale": # module_to_cos_scale（モジュール名をCOS値に変換）
-            return toml_chara_mapping.get(chara, chara)
+            return TOML_CHARA_MAPPING.get(chara, chara)
         else:
             return chara
 
     return map_chara
-
-def is_match(name, contains_str, exclude_str=None):
-    """モジュール名がキーワードにマッチするか判定 (ORマッチ)"""
-    if not contains_str: # contains_strが空の場合
-        return False
-        
-    contains = contains_str.split(',') # contains_strをカンマ区切りで分割
-    includes = [word.strip() for word in contains if word.strip() and not word.strip().startswith('|')] # includes（含むキーワード）
-    
-    # Legacy support: excludes starting with | in contains_str（contains_str内の|で始まる除外キーワードのサポート）
-    legacy_excludes = [word.strip()[1:] for word in contains if word.strip().startswith('|')] # legacy_excludes（除外キーワード）
-    
-    explicit_excludes = [] # explicit_excludes（明示的除外キーワード）
-    if exclude_str: # exclude_strが空の場合
-        explicit_excludes = [word.strip() for word in exclude_str.split(',') if word.strip()] # explicit_excludes（明示的除外キーワード）
-        
-    excludes = legacy_excludes + explicit_excludes # excludes（除外キーワード）
-
-    # 文字化け対策
-    if '\ufffd' in includes:
-        logging.warning(f"設定 {contains_str} に無効な文字が含まれているため、そのキーワードは無視します。")
-        includes = [i for i in includes if i != '\ufffd']
-
-    logging.debug(f"Checking Module: {name} against Includes: {includes}, Excludes: {excludes}")
-
-    # Exclude check (if ANY exclude word is found, return False)（ANDマッチ）
-    if any(exc in name for exc in excludes):
-        return False
-
-    # ORマッチで処理
-    return any(inc in name for inc in includes)